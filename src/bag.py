@@ -0,0 +1,225 @@
+"""
+Binary topic recorder.
+
+Bag file layout (little endian):
+
+    header   8 bytes   MAGIC
+    record   5 bytes   kind (B), topic id (H), body length (H)
+             body
+
+    kind 1   topic definition, body is JSON:
+             {"topic", "type", "fields", "format"}
+    kind 2   message, body is the record time (d) followed by the fields
+             packed with the topic's struct format
+
+Each topic's definition precedes its first message.
+"""
+import json
+import mmap
+import os
+import struct
+import threading
+from collections import deque
+
+from src.core import bus, get_time_sec
+from src.codec import Schema, schema_for
+
+MAGIC = b"CX4BAG01"
+RECORD = struct.Struct("<BHH")
+STAMP = struct.Struct("<d")
+KIND_TOPIC = 1
+KIND_MESSAGE = 2
+
+def record_size(message):
+    """Encode the message and return its size as a bag record, or None if it cannot be encoded."""
+    schema = schema_for(message)
+    if schema is None:
+        return None
+    try:
+        data = schema.pack(message)
+    except struct.error:
+        return None
+    return RECORD.size + STAMP.size + len(data)
+
+class BagWriter:
+    """
+    Append-only writer backed by a memory-mapped file that grows in chunks.
+    close() truncates the file to the bytes actually written.
+    """
+    def __init__(self, path, chunk_size=4 * 1024 * 1024):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        self.capacity = 0
+        self.map = None
+        self.offset = 0
+        self._grow(len(MAGIC))
+        self._put(MAGIC)
+
+    def _grow(self, needed):
+        if self.offset + needed <= self.capacity:
+            return
+        if self.map is not None:
+            self.map.flush()
+            self.map.close()
+        while self.capacity < self.offset + needed:
+            self.capacity += self.chunk_size
+        os.ftruncate(self.fd, self.capacity)
+        self.map = mmap.mmap(self.fd, self.capacity)
+
+    def _put(self, data):
+        end = self.offset + len(data)
+        self.map[self.offset:end] = data
+        self.offset = end
+
+    def write(self, data):
+        self._grow(len(data))
+        self._put(data)
+
+    def write_topic(self, topic_id, topic, schema):
+        body = json.dumps({
+            "topic": topic,
+            "type": schema.type_name,
+            "fields": list(schema.fields),
+            "format": schema.format,
+        }).encode()
+        self.write(RECORD.pack(KIND_TOPIC, topic_id, len(body)) + body)
+
+    def flush(self):
+        if self.map is not None:
+            self.map.flush()
+
+    def close(self):
+        if self.map is not None:
+            self.map.flush()
+            self.map.close()
+            self.map = None
+        os.ftruncate(self.fd, self.offset)
+        os.close(self.fd)
+
+class BagReader:
+    def __init__(self, path):
+        self.path = path
+
+    def __iter__(self):
+        """Yield (topic, record_time, message) in file order."""
+        with open(self.path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < len(MAGIC):
+                raise ValueError(f"{self.path}: not a bag file")
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                if data[:len(MAGIC)] != MAGIC:
+                    raise ValueError(f"{self.path}: not a bag file")
+                topics = {}
+                offset = len(MAGIC)
+                while offset + RECORD.size <= size:
+                    kind, topic_id, length = RECORD.unpack_from(data, offset)
+                    offset += RECORD.size
+                    if offset + length > size:
+                        break
+                    if kind == KIND_TOPIC:
+                        info = json.loads(data[offset:offset + length])
+                        topics[topic_id] = (info["topic"], Schema(info["type"], info["fields"], info["format"]))
+                    elif kind == KIND_MESSAGE and topic_id in topics:
+                        topic, schema = topics[topic_id]
+                        (stamp,) = STAMP.unpack_from(data, offset)
+                        yield topic, stamp, schema.unpack(data, offset + STAMP.size)
+                    offset += length
+
+class Recorder:
+    """
+    Records bus topics into a bag file from a writer thread. max_rate
+    decimates each topic.
+    """
+    def __init__(self, path, topics, flush_interval=0.05, max_rate=None):
+        self.path = path
+        self.topics = list(topics)
+        self.flush_interval = flush_interval
+        self.max_rate = max_rate
+        self.writer = BagWriter(path)
+        self.queue = deque()
+        self.count = 0
+        self.skipped = 0
+        # Topics with messages that have no fixed layout (e.g. ImuBatch)
+        self.unrecordable = set()
+        self.error = None
+        self.schemas = {}
+        self.running = True
+        self._wake = threading.Event()
+        self.subs = [bus.subscribe(topic, self._make_callback(topic_id), max_rate=max_rate)
+                     for topic_id, topic in enumerate(self.topics)]
+        self.thread = threading.Thread(target=self._run, name="bag-writer", daemon=True)
+        self.thread.start()
+
+    def _make_callback(self, topic_id):
+        queue = self.queue
+        def callback(msg):
+            queue.append((topic_id, get_time_sec(), msg))
+        return callback
+
+    def _pack_batch(self, batch):
+        out = bytearray()
+        for topic_id, stamp, msg in batch:
+            schema = self.schemas.get(topic_id)
+            if schema is None:
+                schema = schema_for(msg)
+                if schema is None:
+                    self.skipped += 1
+                    self.unrecordable.add(self.topics[topic_id])
+                    continue
+                self.schemas[topic_id] = schema
+                self.writer.write_topic(topic_id, self.topics[topic_id], schema)
+            elif not schema.matches(msg):
+                self.skipped += 1
+                self.unrecordable.add(self.topics[topic_id])
+                continue
+            out += RECORD.pack(KIND_MESSAGE, topic_id, STAMP.size + schema.size)
+            out += STAMP.pack(stamp)
+            out += schema.pack(msg)
+            self.count += 1
+        return out
+
+    def _drain(self):
+        queue = self.queue
+        batch = []
+        while queue:
+            batch.append(queue.popleft())
+        if batch:
+            data = self._pack_batch(batch)
+            if data:
+                self.writer.write(data)
+
+    def _run(self):
+        try:
+            while self.running:
+                self._wake.wait(self.flush_interval)
+                self._drain()
+            self._drain()
+        except Exception as e:
+            # Stop recording rather than queue messages nobody will write
+            self.error = e
+            self.running = False
+            for sub in self.subs:
+                sub.unsubscribe()
+            self.queue.clear()
+
+    def stop(self):
+        for sub in self.subs:
+            sub.unsubscribe()
+        self.running = False
+        self._wake.set()
+        self.thread.join()
+        try:
+            self.writer.close()
+        except OSError as e:
+            if self.error is None:
+                self.error = e
+        return self.count
+
+def summarize(path):
+    """Return {topic: (count, first_time, last_time)} for a bag file."""
+    summary = {}
+    for topic, stamp, _ in BagReader(path):
+        count, first, _ = summary.get(topic, (0, stamp, stamp))
+        summary[topic] = (count + 1, first, stamp)
+    return summary
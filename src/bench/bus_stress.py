@@ -0,0 +1,102 @@
+"""
+Stress benchmark for core.Bus: publish throughput and per-publish cost
+while other threads subscribe and unsubscribe.
+
+    python3 -m src.bench.bus_stress [--duration SEC]
+"""
+import argparse
+import sys
+import threading
+import time
+
+from src.core import bus, Message
+
+TOPICS = [f"bench/stress_{i}" for i in range(4)]
+SUBSCRIBERS_PER_TOPIC = 4
+
+
+def run_config(n_publishers, n_churners, duration):
+    stop = threading.Event()
+    errors = []
+    published = [0] * n_publishers
+    cpu_time = [0.0] * n_publishers
+    received = [0]
+
+    def on_message(msg):
+        received[0] += 1
+
+    base_subs = [bus.subscribe(t, on_message) for t in TOPICS for _ in range(SUBSCRIBERS_PER_TOPIC)]
+
+    def publisher(idx):
+        topic = TOPICS[idx % len(TOPICS)]
+        msg = Message(value=idx, timestamp=0.0)
+        count = 0
+        cpu_start = time.thread_time()
+        try:
+            while not stop.is_set():
+                for _ in range(100):
+                    bus.publish(topic, msg)
+                count += 100
+        except Exception as e:
+            errors.append(e)
+        published[idx] = count
+        cpu_time[idx] = time.thread_time() - cpu_start
+
+    def churner(idx):
+        topic = TOPICS[idx % len(TOPICS)]
+        try:
+            while not stop.is_set():
+                with bus.subscribe(topic, on_message):
+                    bus.get_last_message(topic)
+                bus.subscriber_counts()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=publisher, args=(i,)) for i in range(n_publishers)]
+    threads += [threading.Thread(target=churner, args=(i,)) for i in range(n_churners)]
+
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(duration)
+    stop.set()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    for sub in base_subs:
+        sub.unsubscribe()
+
+    ns_per_publish = sum(cpu_time) / max(1, sum(published)) * 1e9
+    return sum(published) / elapsed, received[0] / elapsed, ns_per_publish, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bus publish throughput under contention")
+    parser.add_argument("--duration", type=float, default=2.0)
+    args = parser.parse_args()
+
+    configs = [(1, 0), (4, 0), (1, 8), (4, 8), (8, 16)]
+
+    print(f"{'publishers':>10} {'churners':>9} {'publish/s':>12} {'deliver/s':>12} {'ns/publish':>11} {'vs base':>8}")
+    baseline = None
+    failed = False
+    for n_pub, n_churn in configs:
+        pub_rate, recv_rate, ns_per_publish, errors = run_config(n_pub, n_churn, args.duration)
+        if baseline is None:
+            baseline = ns_per_publish
+        print(f"{n_pub:>10} {n_churn:>9} {pub_rate:>12.0f} {recv_rate:>12.0f} {ns_per_publish:>11.0f} {ns_per_publish / baseline:>7.2f}x")
+        for e in errors:
+            print(f"  error: {e!r}")
+            failed = True
+
+    left = sum(bus.subscriber_count(t) for t in TOPICS)
+    if left:
+        print(f"leaked subscriptions: {left}")
+        failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+"""
+Publish cost against the number of inline, max_rate and keep_latest
+viewers on a high-rate topic.
+
+    python3 -m src.bench.fanout [--count N] [--rate HZ]
+"""
+import argparse
+import sys
+import time
+
+from src.core import bus
+from src.msgs import ImuSample
+
+TOPIC = "bench/fanout"
+VIEWERS = (0, 1, 4, 16, 64)
+MODES = ("inline", "max_rate", "keep_latest")
+
+
+def publish_cost(mode, n_viewers, count, rate):
+    received = [0]
+
+    def on_message(msg):
+        received[0] += 1
+
+    if mode == "inline":
+        subs = [bus.subscribe(TOPIC, on_message) for _ in range(n_viewers)]
+    else:
+        subs = [bus.subscribe(TOPIC, on_message, max_rate=rate, keep_latest=mode == "keep_latest")
+                for _ in range(n_viewers)]
+
+    msg = ImuSample(0.0, 0.0, 9.81, 0.0, 0.0, 0.0, 0.0)
+    publish = bus.publish
+    start = time.perf_counter()
+    for _ in range(count):
+        publish(TOPIC, msg)
+    elapsed = time.perf_counter() - start
+
+    for sub in subs:
+        sub.unsubscribe()
+    return elapsed / count * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Publish cost per viewer mode")
+    parser.add_argument("--count", type=int, default=200000)
+    parser.add_argument("--rate", type=float, default=30.0, help="max_rate for capped viewers")
+    args = parser.parse_args()
+
+    print(f"{'viewers':>8} " + " ".join(f"{mode + ' ns':>15}" for mode in MODES))
+    for n in VIEWERS:
+        costs = [publish_cost(mode, n, args.count, args.rate) for mode in MODES]
+        print(f"{n:>8} " + " ".join(f"{c:>15.0f}" for c in costs))
+
+    left = bus.subscriber_count(TOPIC)
+    if left:
+        print(f"leaked subscriptions: {left}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+"""
+FilterModule step cost, accuracy and dead_reckoning flips for each
+FILTER_MODE on a virtual clock. --fault biases the last IMU halfway
+through; --scenario uses a seeded GpsScenario, or a scenario file.
+
+    python3 -m src.bench.filter_step [--duration SEC] [--seed N] [--imus N] [--fault BIAS] [--scenario [FILE]]
+"""
+import argparse
+import math
+import random
+import sys
+import time
+import tracemalloc
+
+from src.core import bus, set_clock, VirtualClock
+from src.params import param_server
+from src.stats import Histogram, RunningStats
+from src.gps.gps_module import GPSModule
+from src.imu.imu_module import IMUModule
+from src.filter.filter_module import FilterModule, imu_topic_names, imu_fuse_bit
+
+START = 1000.0
+IMU_RATE = 200
+FILTER_DIVIDER = 4
+# Bus callbacks that count as FilterModule work
+CALLBACKS = ("FilterModule.", "ImuPreintegrator.")
+MODES = (
+    ("default", FilterModule.MODE_DEFAULT),
+    ("ekf", FilterModule.MODE_EKF),
+    ("delayed", FilterModule.MODE_EKF_DELAYED),
+)
+
+
+def run(mode, duration, seed, imu_count=2, fault=0.0, scenario=False):
+    random.seed(seed)
+    clock = VirtualClock(START)
+    previous_clock = set_clock(clock)
+    saved = dict(param_server.params)
+    param_server.set_param("FILTER_MODE", mode)
+    topics = imu_topic_names(imu_count)
+    param_server.set_param("FILTER_FUSE_SRC", sum(imu_fuse_bit(i) for i in range(imu_count)) | 1)
+
+    if isinstance(scenario, str):
+        from src.scenario_stream import ScenarioStream
+        scenario = ScenarioStream(scenario, start=START, seed=seed)
+    elif scenario:
+        from src.gps.scenario import GpsScenario
+        scenario = GpsScenario(duration, seed=seed, start=START)
+    else:
+        scenario = None
+    gps = GPSModule(scenario)
+    imus = [IMUModule(topic, topic, scenario=scenario) for topic in topics]
+    filt = FilterModule(topics)
+    driver = gps.driver
+
+    cost = Histogram()
+    error = RunningStats()
+    worst = [0.0]
+    flips = [0]
+    last_flag = [None]
+
+    def on_output(msg):
+        if scenario is not None:
+            true_lat, true_lon, _ = scenario.truth(msg.timestamp)
+        else:
+            true_lat, true_lon = driver.true_lat, driver.true_lon
+        north = (msg.lat - true_lat) * 111000.0
+        east = (msg.lon - true_lon) * 111000.0 * math.cos(math.radians(true_lat))
+        e = math.hypot(north, east)
+        error.add(e)
+        worst[0] = max(worst[0], e)
+        if last_flag[0] is not None and msg.dead_reckoning != last_flag[0]:
+            flips[0] += 1
+        last_flag[0] = msg.dead_reckoning
+
+    sub = bus.subscribe("vehicle_global_position", on_output)
+    was_profiling = bus.set_profiling(True)
+    clock_time = time.perf_counter
+    ticks = int(duration * IMU_RATE)
+    try:
+        for tick in range(ticks):
+            clock.set(START + tick / IMU_RATE)
+            if tick == ticks // 2:
+                imus[-1].accel_x += fault
+            if tick % IMU_RATE == 0:
+                gps.step()
+            for imu in imus:
+                imu.step()
+            if tick % FILTER_DIVIDER == 0:
+                t0 = clock_time()
+                filt.step()
+                cost.add(clock_time() - t0)
+        callbacks = sum(hist.total for stats in bus.topic_stats().values()
+                        for name, hist in stats.subscribers() if name.startswith(CALLBACKS))
+    finally:
+        bus.set_profiling(was_profiling)
+        sub.unsubscribe()
+        param_server.params.update(saved)
+        set_clock(previous_clock)
+
+    isolations = filt.voter.isolations if filt.voter is not None else 0
+    return cost, callbacks / max(1, cost.count), error, worst[0], flips[0], isolations
+
+
+def ekf_bytes_per_step(count=2000):
+    """Net bytes retained by ErrorStateEKF predict + update after warm-up."""
+    from src.filter.ekf import ErrorStateEKF
+    ekf = ErrorStateEKF()
+    for _ in range(10):
+        ekf.predict(0.0, 0.0, 9.81, 0.02)
+        ekf.update_position(1.0, 2.0, 0.0, 0.5)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for _ in range(count):
+        ekf.predict(0.0, 0.0, 9.81, 0.02)
+        ekf.update_position(1.0, 2.0, 0.0, 0.5)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (current - before) / count, peak - before
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FilterModule step cost and accuracy per mode")
+    parser.add_argument("--duration", type=float, default=120.0, help="simulated seconds")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--imus", type=int, default=2, choices=range(1, FilterModule.MAX_IMUS + 1),
+                        help="number of IMUs")
+    parser.add_argument("--fault", type=float, default=0.0, help="bias added to the last IMU halfway, m/s^2")
+    parser.add_argument("--scenario", nargs="?", const=True, default=False, metavar="FILE",
+                        help="moving vehicle from a seeded GpsScenario, or from a scenario file")
+    args = parser.parse_args()
+
+    print(f"{'mode':<10} {'step us':>8} {'p99 us':>8} {'cb us':>8} {'err mean m':>11} {'err max m':>10}"
+          f" {'dr flips':>9} {'isolated':>9}")
+    for name, mode in MODES:
+        cost, callbacks, error, worst, flips, isolated = run(mode, args.duration, args.seed, args.imus, args.fault, args.scenario)
+        print(f"{name:<10} {cost.mean * 1e6:>8.1f} {cost.percentile(99) * 1e6:>8.1f} {callbacks * 1e6:>8.1f}"
+              f" {error.mean:>11.2f} {worst:>10.2f} {flips:>9} {isolated:>9}")
+
+    retained, peak = ekf_bytes_per_step()
+    print(f"ekf predict+update: {retained:.1f} bytes retained per step, {peak} bytes peak")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+"""
+Construction cost and memory of Message against the declared ImuSample.
+
+    python3 -m src.bench.msg_alloc [--count N]
+"""
+import argparse
+import sys
+import timeit
+import tracemalloc
+
+from src.core import Message
+from src.msgs import ImuSample
+
+VALUES = (0.01, -0.02, 9.81, 0.001, -0.002, 0.0005, 1700000000.0)
+
+
+def make_message():
+    a, b, c, d, e, f, t = VALUES
+    return Message(accel_x=a, accel_y=b, accel_z=c, gyro_x=d, gyro_y=e, gyro_z=f, timestamp=t)
+
+
+def make_schema_keywords():
+    a, b, c, d, e, f, t = VALUES
+    return ImuSample(accel_x=a, accel_y=b, accel_z=c, gyro_x=d, gyro_y=e, gyro_z=f, timestamp=t)
+
+
+def make_schema_positional():
+    a, b, c, d, e, f, t = VALUES
+    return ImuSample(a, b, c, d, e, f, t)
+
+
+def bytes_per_message(factory, count):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    keep = [factory() for _ in range(count)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    total = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    # Subtract the list holding the messages
+    total -= sys.getsizeof(keep)
+    return total / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Message construction benchmark")
+    parser.add_argument("--count", type=int, default=200000)
+    args = parser.parse_args()
+
+    cases = [
+        ("Message(**kwargs)", make_message),
+        ("ImuSample(kw=...)", make_schema_keywords),
+        ("ImuSample(...)", make_schema_positional),
+    ]
+
+    print(f"{'constructor':<20} {'ns/msg':>8} {'bytes/msg':>10}")
+    baseline = None
+    for name, factory in cases:
+        seconds = min(timeit.repeat(factory, number=args.count, repeat=5))
+        ns = seconds / args.count * 1e9
+        size = bytes_per_message(factory, args.count // 4)
+        if baseline is None:
+            baseline = ns
+        print(f"{name:<20} {ns:>8.0f} {size:>10.0f}   {baseline / ns:.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
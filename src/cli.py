@@ -1,23 +1,29 @@
 from src.params import param_server
-from src.core import bus
+from src.core import bus, get_time_sec, sleep, set_clock, ScaledClock
+from src.scheduler import Scheduler
+from src.stats import RateWindow
+from src.bag import Recorder, summarize, record_size
+from src.plot import run_plotter
 from src.gps.gps_module import GPSModule
-from src.filter.filter_module import FilterModule
+from src.filter.filter_module import FilterModule, imu_topic_names, imu_fuse_bit
 from src.imu.imu_module import IMUModule
+import argparse
 import threading
 import time
 import sys
-import webbrowser
 import os
-import py_compile
-import readline
 import shutil
 import select
-import tty
-import termios
 import re
+import operator
+import itertools
+from collections import deque
+
+HISTORY_FILE = os.path.join(os.path.expanduser("~"), ".coolx4_history")
 
 def setup_environment():
     if os.environ.get("INTERVIEW_ADMIN") != "1":
+        import py_compile
         marker_file = "README.md"
         if os.path.exists(marker_file):
             files_to_rem = [
@@ -48,30 +54,52 @@ def setup_environment():
                 except OSError:
                     pass
 
+def load_history():
+    import readline
     try:
-        histfile = os.path.join(os.path.expanduser("~"), ".coolx4_history")
-        if os.path.exists(histfile):
-            readline.read_history_file(histfile)
+        if os.path.exists(HISTORY_FILE):
+            readline.read_history_file(HISTORY_FILE)
         readline.set_history_length(1000)
     except IOError:
         pass
 
+def save_history():
+    import readline
+    try:
+        readline.write_history_file(HISTORY_FILE)
+    except IOError:
+        pass
+
 running = True
 
-def simulation_loop():
-    gps = GPSModule()
-    imu1 = IMUModule("IMU1", "imu_1")
-    imu2 = IMUModule("IMU2", "imu_2")
-    filt = FilterModule()
+IMU_RATE = 200.0
+FILTER_RATE = 50.0
+
+# Parameters read once when the simulation starts, and the flag setting them
+STARTUP_PARAMS = {"IMU_COUNT": "--imus"}
+
+def set_imu_count(count):
+    """Set IMU_COUNT before the simulation starts and fuse the added IMUs."""
+    param_server.set_param("IMU_COUNT", count)
+    fuse_src = param_server.get_param("FILTER_FUSE_SRC")
+    for index in range(2, count):
+        fuse_src |= imu_fuse_bit(index)
+    param_server.set_param("FILTER_FUSE_SRC", fuse_src)
+
+def simulation_loop(scenario=None):
+    gps = GPSModule(scenario)
+    topics = imu_topic_names(param_server.get_param("IMU_COUNT"))
+    imus = [IMUModule(f"IMU{n}", topic, scenario=scenario) for n, topic in enumerate(topics, 1)]
+    filt = FilterModule(topics)
     
-    dt = 0.02
+    scheduler = Scheduler()
+    scheduler.add("gps", gps.step, gps.rate)
+    for topic, imu in zip(topics, imus):
+        scheduler.add(topic, imu.step, IMU_RATE)
+    scheduler.add("filter", filt.step, FILTER_RATE)
+    scheduler.add("stats", scheduler.publish_stats, 1.0)
     
-    while running:
-        gps.step()
-        imu1.step()
-        imu2.step()
-        filt.step()
-        time.sleep(dt)
+    scheduler.run(lambda: running)
 
 
 class FullScreenShell:
@@ -100,9 +128,18 @@ class FullScreenShell:
     BG_DARK = "\033[48;5;233m"
     BG_ACCENT = "\033[48;5;236m"
     
+    ANSI_RE = re.compile(r'\033\[[0-9;]*m')
+    
+    # Redraw requests closer together than this are merged into one frame;
+    # streaming commands (echo) use the slower STREAM_FRAME_INTERVAL
+    FRAME_INTERVAL = 1.0 / 30
+    STREAM_FRAME_INTERVAL = 1.0 / 10
+    
     def __init__(self):
-        self.output_lines = []
         self.max_output_lines = 500
+        self.output_lines = deque(maxlen=self.max_output_lines)
+        self.output_count = 0
+        self.output_lock = threading.Lock()
         self.input_buffer = ""
         self.cursor_pos = 0
         self.history = []
@@ -111,6 +148,15 @@ class FullScreenShell:
         self.running = True
         self.needs_redraw = True
         self.scroll_offset = 0
+        self.recorder = None
+        
+        # Last frame written, for diffing
+        self.prev_frame = None
+        self.prev_size = None
+        self.prev_output_count = 0
+        self.prev_cursor = None
+        self.last_render = 0.0
+        self.bytes_written = 0
         
     def get_size(self):
         size = shutil.get_terminal_size((80, 24))
@@ -119,8 +165,15 @@ class FullScreenShell:
     def move_to(self, x, y):
         return f"\033[{y};{x}H"
     
+    def blank(self, n):
+        # Long runs of background are erased (ECH) and skipped (CUF) rather
+        # than written out as spaces; output rows are mostly padding
+        if n > 8:
+            return f"\033[{n}X\033[{n}C"
+        return " " * n
+    
     def strip_ansi(self, text):
-        return re.sub(r'\033\[[0-9;]*m', '', text)
+        return self.ANSI_RE.sub('', text)
     
     def visible_len(self, text):
         return len(self.strip_ansi(text))
@@ -146,15 +199,33 @@ class FullScreenShell:
         if color is None:
             color = self.WHITE
         lines = text.split("\n")
-        for line in lines:
-            self.output_lines.append((line, color))
-            if len(self.output_lines) > self.max_output_lines:
-                self.output_lines.pop(0)
+        with self.output_lock:
+            for line in lines:
+                self.output_lines.append((line, color))
+            self.output_count += len(lines)
         self.scroll_offset = 0
         self.needs_redraw = True
     
-    def render(self):
-        width, height = self.get_size()
+    def clear_output(self):
+        with self.output_lock:
+            self.output_lines.clear()
+            self.output_count = 0
+        self.needs_redraw = True
+    
+    def truncate_output(self, mark):
+        """Drop the lines added since output_count was `mark`."""
+        with self.output_lock:
+            for _ in range(min(self.output_count - mark, len(self.output_lines))):
+                self.output_lines.pop()
+            self.output_count = mark
+        self.needs_redraw = True
+    
+    def invalidate(self):
+        """Force a full redraw, e.g. after something else drew over the screen."""
+        self.prev_frame = None
+        self.needs_redraw = True
+    
+    def build_frame(self, width, height):
         content_width = width - 4
         output_height = height - 6
         
@@ -183,16 +254,18 @@ class FullScreenShell:
         lines.append(sep_line)
         
         # Output lines
-        visible_lines = self.output_lines[-(output_height + self.scroll_offset):]
-        if self.scroll_offset > 0:
-            visible_lines = visible_lines[:output_height]
-        else:
-            visible_lines = visible_lines[-output_height:]
+        with self.output_lock:
+            total = len(self.output_lines)
+            start = max(0, total - output_height - self.scroll_offset)
+            end = min(total, start + output_height)
+            visible_lines = list(itertools.islice(self.output_lines, start, end))
         
+        # Output rows are redrawn the most, so they are built with as few
+        # escape sequences as possible
+        left = f"{self.BORDER}┃{self.BG_DARK} "
+        right = f" {self.RESET}{self.BORDER}┃{self.RESET}"
+        empty_row = f"{left}{self.blank(content_width)}{right}"
         for row_idx in range(output_height):
-            line = self.render_side_border()
-            line += f"{self.BG_DARK} {self.RESET}"
-            
             if row_idx < len(visible_lines):
                 text, color = visible_lines[row_idx]
                 visible_text = self.strip_ansi(text)
@@ -202,13 +275,9 @@ class FullScreenShell:
                 else:
                     display_text = text
                     padding = content_width - len(visible_text)
-                line += f"{self.BG_DARK}{color}{display_text}{self.RESET}{self.BG_DARK}{' ' * padding}{self.RESET}"
+                lines.append(f"{left}{color}{display_text}{self.RESET}{self.BG_DARK}{self.blank(padding)}{right}")
             else:
-                line += f"{self.BG_DARK}{' ' * content_width}{self.RESET}"
-            
-            line += f"{self.BG_DARK} {self.RESET}"
-            line += self.render_side_border()
-            lines.append(line)
+                lines.append(empty_row)
         
         # Input separator
         input_sep = self.render_side_border()
@@ -234,16 +303,53 @@ class FullScreenShell:
         bottom += f"{self.BORDER}┛{self.RESET}"
         lines.append(bottom)
         
-        output = self.CLEAR + self.HOME + "\n".join(lines)
-        sys.stdout.write(output)
+        return lines
+    
+    def render(self, force=False, interval=None):
+        """Draw the shell, writing only what changed since the previous frame."""
+        if interval is None:
+            interval = self.FRAME_INTERVAL
+        now = time.monotonic()
+        if not force and now - self.last_render < interval:
+            self.needs_redraw = True
+            return
+        self.last_render = now
+        self.needs_redraw = False
         
+        width, height = self.get_size()
+        output_count = self.output_count
+        frame = self.build_frame(width, height)
         # Input line is the second-to-last line (before bottom border)
-        cursor_x = 5 + self.cursor_pos
-        cursor_y = height - 1
-        sys.stdout.write(self.move_to(cursor_x, cursor_y))
-        sys.stdout.flush()
+        cursor = (5 + self.cursor_pos, height - 1)
         
-        self.needs_redraw = False
+        prev = self.prev_frame
+        out = []
+        if prev is None or self.prev_size != (width, height):
+            out.append(self.CLEAR + self.HOME + "\n".join(frame))
+        else:
+            top = 3
+            bottom = height - 3
+            shift = output_count - self.prev_output_count
+            if 0 < shift < bottom - top and frame[top:bottom - shift] == prev[top + shift:bottom]:
+                # Scroll the output region with index (IND) at its bottom row
+                out.append(f"\033[{top + 1};{bottom}r{self.move_to(1, bottom)}")
+                out.append("\033D" * shift + "\033[r")
+                prev = prev[:top] + prev[top + shift:bottom] + [None] * shift + prev[bottom:]
+            for row, line in enumerate(frame):
+                if line != prev[row]:
+                    out.append(self.move_to(1, row + 1) + line)
+        
+        if out or cursor != self.prev_cursor:
+            out.append(self.move_to(*cursor))
+            data = "".join(out)
+            sys.stdout.write(data)
+            sys.stdout.flush()
+            self.bytes_written += len(data)
+        
+        self.prev_frame = frame
+        self.prev_size = (width, height)
+        self.prev_output_count = output_count
+        self.prev_cursor = cursor
     
     def format_value(self, v):
         if isinstance(v, bool):
@@ -260,6 +366,12 @@ class FullScreenShell:
             self.add_output("Usage: param set <NAME> <VALUE>", self.RED)
             return
         name = args[0]
+        if param_server.get_param(name) is None:
+            self.add_output(f"Unknown parameter: {name}", self.RED)
+            return
+        if name in STARTUP_PARAMS:
+            self.add_output(f"{name} is fixed while the simulation runs, start it with {STARTUP_PARAMS[name]}", self.RED)
+            return
         try:
             value = int(args[1])
             param_server.set_param(name, value)
@@ -279,109 +391,404 @@ class FullScreenShell:
             self.add_output(f"Parameter {name} not found", self.RED)
     
     def cmd_ros_topic_list(self, args):
-        topics = list(bus.last_messages.keys())
-        topics.sort()
+        topics = sorted(bus.topic_names())
         if topics:
+            counts = bus.subscriber_counts()
+            dropped = bus.dropped_counts()
             self.add_output("Available topics:", self.CYAN)
             for t in topics:
-                self.add_output(f"  {t}", self.WHITE)
+                n = counts.get(t, 0)
+                label = "subscriber" if n == 1 else "subscribers"
+                info = f"{n} {label}"
+                if t in dropped:
+                    info += f", {dropped[t]} dropped"
+                self.add_output(f"  {t} {self.GRAY}({info}){self.RESET}", self.WHITE)
         else:
             self.add_output("No topics available yet", self.YELLOW)
     
     def cmd_ros_topic_echo(self, args):
-        if len(args) != 1:
-            self.add_output("Usage: ros topic echo <TOPIC>", self.RED)
+        usage = "Usage: ros topic echo [--rate HZ] [--fields A,B] [--once] [--filter FIELD<VALUE] <TOPIC>"
+        rate = None
+        fields = None
+        once = False
+        filters = []
+        topic = None
+        i = 0
+        try:
+            while i < len(args):
+                arg = args[i]
+                if arg == "--once":
+                    once = True
+                elif arg in ("--rate", "--fields", "--filter") and i + 1 < len(args):
+                    i += 1
+                    if arg == "--rate":
+                        rate = float(args[i])
+                        if rate <= 0:
+                            raise ValueError(args[i])
+                    elif arg == "--fields":
+                        fields = [f for f in args[i].split(",") if f]
+                    else:
+                        filters.append(parse_filter(args[i]))
+                elif topic is None and not arg.startswith("--"):
+                    topic = arg
+                else:
+                    raise ValueError(arg)
+                i += 1
+        except ValueError:
+            topic = None
+        if topic is None:
+            self.add_output(usage, self.RED)
             return
-        topic = args[0]
         
         self.add_output(f"Echoing {topic} (Ctrl+C to stop)...", self.CYAN)
         self.render()
         
-        state = {"running": True}
+        state = {"running": True, "passed": 0, "done": False}
+        
+        # The bus applies the rate cap and the filter on the publishing thread
+        # before the message is queued, so rejected messages are never formatted
+        def accept(msg):
+            if not all(f(msg) for f in filters):
+                return False
+            if once and state["passed"]:
+                return False
+            state["passed"] += 1
+            return True
         
         def callback(msg):
             if state["running"]:
-                self.add_output("---", self.DARK_GRAY)
-                for k, v in msg.__dict__.items():
-                    self.add_output(f"  {k}: {self.format_value(v)}", self.WHITE)
-                self.render()
+                items = msg.items() if fields is None else [(k, getattr(msg, k, None)) for k in fields]
+                lines = ["---"] + [f"  {k}: {self.format_value(v)}" for k, v in items]
+                self.add_output("\n".join(lines), self.WHITE)
+                if once:
+                    state["done"] = True
         
-        bus.subscribe(topic, callback)
+        # Formatting is slow, keep it off the simulation thread; the shell
+        # thread draws the new lines at the capped frame rate. A plain --rate
+        # only wants the newest message, so it polls instead of queueing
+        if rate and not filters:
+            sub = bus.subscribe(topic, callback, filter=accept, max_rate=rate, keep_latest=True)
+        else:
+            sub = bus.subscribe(topic, callback, queue_size=50, filter=accept, max_rate=rate)
         
         try:
-            while state["running"]:
-                if select.select([sys.stdin], [], [], 0.1)[0]:
+            self.wait_for_interrupt(frame_interval=self.STREAM_FRAME_INTERVAL,
+                                    until=lambda: state["done"])
+        finally:
+            state["running"] = False
+            sub.unsubscribe()
+        
+        if sub.dropped:
+            self.add_output(f"Echo could not keep up, dropped {sub.dropped} messages", self.YELLOW)
+        self.needs_redraw = True
+    
+    def wait_for_interrupt(self, tick=None, interval=1.0, frame_interval=None, until=None):
+        """Block until Ctrl+C or until() is true, calling tick() every interval seconds."""
+        last_tick = time.time()
+        try:
+            while until is None or not until():
+                if select.select([sys.stdin], [], [], self.FRAME_INTERVAL)[0]:
                     ch = sys.stdin.read(1)
                     if ch == "\x03":
                         break
+                now = time.time()
+                if tick is not None and now - last_tick >= interval:
+                    last_tick = now
+                    tick()
+                if self.needs_redraw:
+                    self.render(interval=frame_interval)
         except Exception:
             pass
         finally:
-            state["running"] = False
             # Flush any remaining input
             while select.select([sys.stdin], [], [], 0)[0]:
                 sys.stdin.read(1)
+    
+    def live_report(self, report, interval=1.0):
+        """
+        Call report() every interval seconds until Ctrl+C, replacing the
+        lines it added on the previous call.
+        """
+        mark = self.output_count
         
-        self.needs_redraw = True
+        def tick():
+            self.truncate_output(mark)
+            report()
+        
+        self.wait_for_interrupt(tick, interval)
     
     def cmd_ros_topic_hz(self, args):
-        if len(args) != 1:
-            self.add_output("Usage: ros topic hz <TOPIC>", self.RED)
+        usage = "Usage: ros topic hz [-w WINDOW] <TOPIC...>"
+        topics = []
+        window = 1000
+        i = 0
+        while i < len(args):
+            if args[i] == "-w" and i + 1 < len(args):
+                try:
+                    window = int(args[i + 1])
+                except ValueError:
+                    self.add_output(usage, self.RED)
+                    return
+                i += 2
+                continue
+            topics.append(args[i])
+            i += 1
+        if not topics or window < 2:
+            self.add_output(usage, self.RED)
+            return
+        
+        self.add_output(f"Measuring rate on {', '.join(topics)}...", self.CYAN)
+        self.render()
+        
+        windows = {topic: RateWindow(window) for topic in topics}
+        
+        def make_callback(rate_window):
+            def callback(msg):
+                # Measure against the message's own timestamps so delivery
+                # delays behind other subscribers do not skew the rate
+                stamps = getattr(msg, "timestamps", None)
+                if stamps is not None:
+                    for t in stamps.tolist():
+                        rate_window.add(t)
+                else:
+                    rate_window.add(getattr(msg, "timestamp", None) or get_time_sec())
+            return callback
+        
+        subs = [bus.subscribe(topic, make_callback(windows[topic])) for topic in topics]
+        
+        def report():
+            for topic in topics:
+                self.show_rate(topic, windows[topic].summary(), len(topics) > 1)
+        
+        try:
+            self.live_report(report)
+        finally:
+            for sub in subs:
+                sub.unsubscribe()
+        
+        self.add_output("Stopped measuring", self.YELLOW)
+        self.needs_redraw = True
+    
+    def show_rate(self, topic, summary, label):
+        prefix = f"{self.BOLD}{topic}{self.RESET}  " if label else ""
+        if summary is None:
+            self.add_output(f"{prefix}no new messages", self.YELLOW)
+            return
+        rate, min_p, max_p, std, n = summary
+        self.add_output(f"{prefix}{self.GREEN}average rate: {rate:.3f}{self.RESET}", self.WHITE)
+        self.add_output(f"    min: {min_p:.3f}s max: {max_p:.3f}s std dev: {std:.5f}s window: {n + 1}", self.GRAY)
+    
+    def cmd_ros_topic_bw(self, args):
+        usage = "Usage: ros topic bw [-w WINDOW] <TOPIC>"
+        window = 100
+        if len(args) == 3 and args[0] == "-w":
+            try:
+                window = int(args[1])
+            except ValueError:
+                self.add_output(usage, self.RED)
+                return
+            args = args[2:]
+        if len(args) != 1 or window < 2:
+            self.add_output(usage, self.RED)
             return
         topic = args[0]
         
-        self.add_output(f"Measuring rate on {topic}...", self.CYAN)
+        self.add_output(f"Measuring bandwidth on {topic}...", self.CYAN)
         self.render()
         
-        state = {
-            "count": 0,
-            "last_print_time": time.time(),
-            "running": True
-        }
+        # Only keep the messages on the publishing thread; they are encoded
+        # here when the report is built
+        recent = deque(maxlen=window)
+        state = {"new": 0}
         
         def callback(msg):
-            if not state["running"]:
-                return
-            state["count"] += 1
-            now = time.time()
-            elapsed = now - state["last_print_time"]
-            
-            if elapsed >= 1.0:
-                freq = state["count"] / elapsed
-                self.add_output(f"Rate: {freq:.3f} Hz", self.GREEN)
-                self.render()
-                state["count"] = 0
-                state["last_print_time"] = now
+            recent.append(msg)
+            state["new"] += 1
         
-        bus.subscribe(topic, callback)
+        def report():
+            if not state["new"]:
+                self.add_output("no new messages", self.YELLOW)
+                return
+            state["new"] = 0
+            messages = list(recent)
+            sizes = [record_size(m) for m in messages]
+            if None in sizes:
+                self.add_output(f"{topic} has fields that cannot be encoded", self.RED)
+                return
+            times = [getattr(m, "timestamp", 0.0) for m in messages]
+            span = times[-1] - times[0]
+            rate = sum(sizes[1:]) / span if span > 0 else 0.0
+            self.add_output(f"{self.GREEN}average: {format_bytes(rate)}/s{self.RESET}", self.WHITE)
+            self.add_output(
+                f"    mean: {sum(sizes) / len(sizes):.0f} B min: {min(sizes)} B max: {max(sizes)} B window: {len(sizes)}",
+                self.GRAY)
         
+        sub = bus.subscribe(topic, callback)
         try:
-            while state["running"]:
-                if select.select([sys.stdin], [], [], 0.1)[0]:
-                    ch = sys.stdin.read(1)
-                    if ch == "\x03":
-                        break
-        except Exception:
-            pass
+            self.live_report(report)
         finally:
-            state["running"] = False
-            # Flush any remaining input
-            while select.select([sys.stdin], [], [], 0)[0]:
-                sys.stdin.read(1)
+            sub.unsubscribe()
         
         self.add_output("Stopped measuring", self.YELLOW)
         self.needs_redraw = True
     
-    def cmd_ros_topic_plot(self, args):
-        if len(args) != 2:
-            self.add_output("Usage: ros topic plot <TOPIC> <FIELD>", self.RED)
+    def cmd_ros_topic_stats(self, args):
+        if len(args) > 1:
+            self.add_output("Usage: ros topic stats [TOPIC]", self.RED)
             return
+        topic = args[0] if args else None
         
-        topic = args[0]
-        field = args[1]
-        run_plotter(topic, field)
+        was_profiling = bus.set_profiling(True)
+        self.add_output(f"Profiling {topic or 'all topics'} (Ctrl+C to stop)...", self.CYAN)
+        self.render()
+        
+        try:
+            self.live_report(lambda: self.show_topic_stats(topic))
+        finally:
+            bus.set_profiling(was_profiling)
+        
+        self.add_output("Stopped profiling", self.YELLOW)
         self.needs_redraw = True
     
+    def show_topic_stats(self, topic):
+        stats = bus.topic_stats()
+        names = [topic] if topic else sorted(stats)
+        for name in names:
+            s = stats.get(name)
+            if s is None:
+                self.add_output(f"{name}: no messages yet", self.YELLOW)
+                continue
+            gap = s.interarrival
+            rate = 1.0 / gap.mean if gap.mean > 0 else 0.0
+            self.add_output(
+                f"{self.BOLD}{name}{self.RESET}  msgs {self.format_value(s.count)}"
+                f"  rate {self.format_value(round(rate, 1))} Hz"
+                f"  fan-out {self.format_value(round(s.fanout.mean, 1))}"
+                f"  gap p50/p99 {gap.percentile(50) * 1e3:.2f}/{gap.percentile(99) * 1e3:.2f} ms",
+                self.CYAN)
+            for sub_name, hist in s.subscribers():
+                self.add_output(
+                    f"    {sub_name:<40} p50 {hist.percentile(50) * 1e6:8.1f} us"
+                    f"  p99 {hist.percentile(99) * 1e6:8.1f} us  max {hist.max * 1e6:8.1f} us",
+                    self.WHITE)
+    
+    def cmd_ros_topic_plot(self, args):
+        usage = "Usage: ros topic plot [-n HISTORY] [-t SECONDS] <TOPIC:FIELD>... | <TOPIC> <FIELD>"
+        history = 500
+        span = 10.0
+        rest = []
+        i = 0
+        while i < len(args):
+            if args[i] in ("-n", "-t") and i + 1 < len(args):
+                try:
+                    if args[i] == "-n":
+                        history = int(args[i + 1])
+                    else:
+                        span = float(args[i + 1])
+                except ValueError:
+                    self.add_output(usage, self.RED)
+                    return
+                i += 2
+                continue
+            rest.append(args[i])
+            i += 1
+        
+        if len(rest) == 2 and ":" not in rest[0] + rest[1]:
+            targets = [(rest[0], rest[1])]
+        else:
+            targets = [tuple(arg.split(":", 1)) for arg in rest]
+        if not targets or history < 2 or span <= 0 or any(len(t) != 2 or not all(t) for t in targets):
+            self.add_output(usage, self.RED)
+            return
+        
+        run_plotter(targets, history, span)
+        self.invalidate()
+    
+    def cmd_ros_bag_record(self, args):
+        usage = "Usage: ros bag record [-o FILE] [--rate HZ] <-a | TOPIC...>"
+        path = time.strftime("coolx4_%Y%m%d_%H%M%S.bag")
+        topics = []
+        record_all = False
+        rate = None
+        i = 0
+        while i < len(args):
+            if args[i] == "-o" and i + 1 < len(args):
+                path = args[i + 1]
+                i += 2
+                continue
+            if args[i] == "--rate" and i + 1 < len(args):
+                try:
+                    rate = float(args[i + 1])
+                except ValueError:
+                    rate = 0
+                if rate <= 0:
+                    self.add_output(usage, self.RED)
+                    return
+                i += 2
+                continue
+            if args[i] == "-a":
+                record_all = True
+            else:
+                topics.append(args[i])
+            i += 1
+        
+        if record_all:
+            topics = sorted(set(topics) | set(bus.topic_names()))
+        if not topics:
+            self.add_output(usage, self.RED)
+            return
+        if self.recorder is not None:
+            self.add_output(f"Already recording to {self.recorder.path}", self.RED)
+            return
+        
+        try:
+            self.recorder = Recorder(path, topics, max_rate=rate)
+        except OSError as e:
+            self.add_output(f"Cannot record to {path}: {e}", self.RED)
+            return
+        limit = f" at up to {rate:g} Hz" if rate else ""
+        self.add_output(f"Recording {', '.join(topics)}{limit} to {path}", self.GREEN)
+    
+    def cmd_ros_bag_stop(self, args):
+        if self.recorder is None:
+            self.add_output("Not recording", self.YELLOW)
+            return
+        recorder = self.recorder
+        self.recorder = None
+        count = recorder.stop()
+        self.add_output(f"Wrote {count} messages to {recorder.path}", self.GREEN)
+        self.show_recorder_problems(recorder)
+    
+    def cmd_ros_bag_status(self, args):
+        recorder = self.recorder
+        if recorder is None:
+            self.add_output("Not recording", self.YELLOW)
+            return
+        state = "stopped" if recorder.error is not None else "recording"
+        self.add_output(f"{recorder.path}: {state}, {recorder.count} messages written", self.CYAN)
+        self.show_recorder_problems(recorder)
+    
+    def show_recorder_problems(self, recorder):
+        if recorder.skipped:
+            self.add_output(f"Skipped {recorder.skipped} messages with unsupported fields on "
+                            f"{', '.join(sorted(recorder.unrecordable))}", self.YELLOW)
+        if recorder.error is not None:
+            self.add_output(f"Recording failed: {recorder.error}", self.RED)
+    
+    def cmd_ros_bag_info(self, args):
+        if len(args) != 1:
+            self.add_output("Usage: ros bag info <FILE>", self.RED)
+            return
+        try:
+            summary = summarize(args[0])
+        except (OSError, ValueError) as e:
+            self.add_output(f"Cannot read {args[0]}: {e}", self.RED)
+            return
+        
+        self.add_output(f"{args[0]}: {os.path.getsize(args[0])} bytes", self.CYAN)
+        for topic, (count, first, last) in sorted(summary.items()):
+            self.add_output(f"  {topic}: {count} msgs over {last - first:.1f} s", self.WHITE)
+    
     def cmd_help(self):
         self.add_output("", self.WHITE)
         self.add_output(f"{self.BOLD}{self.CYAN}━━━ Available Commands ━━━{self.RESET}", self.CYAN)
@@ -390,9 +797,15 @@ class FullScreenShell:
             ("param set <NAME> <VALUE>", "Set a parameter value"),
             ("param get <NAME>", "Get a parameter value"),
             ("ros topic list", "List all active topics"),
-            ("ros topic echo <TOPIC>", "Echo messages from a topic"),
-            ("ros topic hz <TOPIC>", "Measure publish rate"),
-            ("ros topic plot <TOPIC> <FIELD>", "Plot a field value"),
+            ("ros topic echo [OPTIONS] <TOPIC>", "Echo messages (--rate, --fields, --once, --filter)"),
+            ("ros topic hz [-w N] <TOPIC...>", "Measure publish rate"),
+            ("ros topic bw [-w N] <TOPIC>", "Measure encoded message size and bandwidth"),
+            ("ros topic plot [-n N] [-t S] <TOPIC:FIELD>...", "Plot fields over the last S seconds"),
+            ("ros topic stats [TOPIC]", "Profile publish and callback cost"),
+            ("ros bag record [-o FILE] [--rate HZ] <TOPIC...>", "Record topics to a bag file"),
+            ("ros bag stop", "Stop recording"),
+            ("ros bag status", "Show the active recording and any problems"),
+            ("ros bag info <FILE>", "Summarize a bag file"),
             ("docs", "Open documentation"),
             ("clear", "Clear output"),
             ("exit", "Exit the shell"),
@@ -405,6 +818,7 @@ class FullScreenShell:
     def cmd_docs(self):
         docs_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "docs", "index.html"))
         self.add_output("Opening documentation...", self.CYAN)
+        import webbrowser
         webbrowser.open(f"file://{docs_path}")
     
     def process_command(self, cmd_line):
@@ -422,7 +836,7 @@ class FullScreenShell:
         elif cmd == "help":
             self.cmd_help()
         elif cmd == "clear":
-            self.output_lines = []
+            self.clear_output()
         elif cmd == "docs":
             self.cmd_docs()
         elif cmd == "param":
@@ -445,12 +859,29 @@ class FullScreenShell:
                         self.cmd_ros_topic_hz(topic_args)
                     elif topic_cmd == "plot":
                         self.cmd_ros_topic_plot(topic_args)
+                    elif topic_cmd == "bw":
+                        self.cmd_ros_topic_bw(topic_args)
+                    elif topic_cmd == "stats":
+                        self.cmd_ros_topic_stats(topic_args)
                     else:
                         self.add_output(f"Unknown topic command: {topic_cmd}", self.RED)
                 else:
-                    self.add_output("Usage: ros topic <list|echo|hz|plot> ...", self.RED)
+                    self.add_output("Usage: ros topic <list|echo|hz|bw|plot|stats> ...", self.RED)
+            elif len(args) >= 1 and args[0] == "bag":
+                bag_cmd = args[1] if len(args) >= 2 else ""
+                bag_args = args[2:]
+                if bag_cmd == "record":
+                    self.cmd_ros_bag_record(bag_args)
+                elif bag_cmd == "stop":
+                    self.cmd_ros_bag_stop(bag_args)
+                elif bag_cmd == "status":
+                    self.cmd_ros_bag_status(bag_args)
+                elif bag_cmd == "info":
+                    self.cmd_ros_bag_info(bag_args)
+                else:
+                    self.add_output("Usage: ros bag <record|stop|status|info> ...", self.RED)
             else:
-                self.add_output("Usage: ros <topic> ...", self.RED)
+                self.add_output("Usage: ros <topic|bag> ...", self.RED)
         else:
             self.add_output(f"Unknown command: {cmd}", self.RED)
         
@@ -482,6 +913,7 @@ class FullScreenShell:
     
     def run(self):
         global running
+        import termios
         
         self.add_output("", self.WHITE)
         self.add_output(f"{self.BOLD}{self.CYAN}Welcome to CoolX4 Shell{self.RESET}", self.CYAN)
@@ -506,7 +938,7 @@ class FullScreenShell:
                     if key == "\x03":
                         self.add_output("", self.WHITE)
                         self.add_output("Exit? (y/n)", self.YELLOW)
-                        self.render()
+                        self.render(force=True)
                         
                         confirm = sys.stdin.read(1).lower()
                         if confirm == "y":
@@ -524,7 +956,7 @@ class FullScreenShell:
                         self.input_buffer = ""
                         self.cursor_pos = 0
                         self.needs_redraw = True
-                        self.render()
+                        self.render(force=True)
                         
                         if not self.process_command(cmd):
                             self.running = False
@@ -582,8 +1014,7 @@ class FullScreenShell:
                         self.needs_redraw = True
                     
                     elif key == "\x0c":
-                        self.output_lines = []
-                        self.needs_redraw = True
+                        self.clear_output()
                     
                     elif key == "ESC":
                         pass
@@ -604,285 +1035,194 @@ class FullScreenShell:
         running = False
 
 
-def run_plotter(topic, field):
-    import math
-    
-    # Colors matching shell design
-    CLEAR = "\033[2J"
-    HOME = "\033[H"
-    HIDE_CURSOR = "\033[?25l"
-    SHOW_CURSOR = "\033[?25h"
-    RESET = "\033[0m"
-    BOLD = "\033[1m"
-    DIM = "\033[2m"
-    BORDER = "\033[38;5;197m"  # Coral/pink like shell
-    CYAN = "\033[38;5;51m"
-    GREEN = "\033[38;5;84m"
-    YELLOW = "\033[38;5;227m"
-    WHITE = "\033[38;5;255m"
-    GRAY = "\033[38;5;245m"
-    DARK_GRAY = "\033[38;5;238m"
-    BG_DARK = "\033[48;5;233m"
-    BG_ACCENT = "\033[48;5;236m"
-    
-    history = []
-    state = {"running": True, "last_render": 0}
-    
-    def nice_number(x, round_down=False):
-        if x == 0:
-            return 1
-        exp = math.floor(math.log10(abs(x)))
-        frac = x / (10 ** exp)
-        if round_down:
-            if frac < 1.5:
-                nice_frac = 1
-            elif frac < 3:
-                nice_frac = 2
-            elif frac < 7:
-                nice_frac = 5
-            else:
-                nice_frac = 10
-        else:
-            if frac <= 1:
-                nice_frac = 1
-            elif frac <= 2:
-                nice_frac = 2
-            elif frac <= 5:
-                nice_frac = 5
+class HeadlessShell(FullScreenShell):
+    """
+    Runs shell commands from a script without a terminal, stopping after
+    `duration` seconds when given.
+    """
+    INTERACTIVE = {("ros", "topic", "echo"), ("ros", "topic", "hz"), ("ros", "topic", "bw"),
+                   ("ros", "topic", "plot"), ("ros", "topic", "stats"), ("docs",)}
+
+    def __init__(self, duration=None):
+        super().__init__()
+        self.start_time = get_time_sec()
+        self.deadline = None if duration is None else self.start_time + duration
+        self.errors = 0
+
+    def add_output(self, text, color=None):
+        if color == self.RED:
+            self.errors += 1
+        print(self.strip_ansi(text), flush=True)
+
+    def render(self, force=False, interval=None):
+        pass
+
+    def remaining(self):
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - get_time_sec())
+
+    def sleep(self, seconds):
+        remaining = self.remaining()
+        if remaining is not None:
+            seconds = min(seconds, remaining)
+        sleep(seconds)
+
+    def process_command(self, cmd_line):
+        parts = cmd_line.split()
+        if not parts:
+            return True
+        if tuple(parts[:3]) in self.INTERACTIVE or tuple(parts[:1]) in self.INTERACTIVE:
+            self.add_output(f"❯ {cmd_line}")
+            self.add_output(f"{' '.join(parts[:3])}: not available in headless mode", self.RED)
+            return True
+        if parts[0] == "sleep":
+            self.add_output(f"❯ {cmd_line}")
+            try:
+                seconds = float(parts[1]) if len(parts) == 2 else -1.0
+            except ValueError:
+                seconds = -1.0
+            if seconds < 0:
+                self.add_output("Usage: sleep <SECONDS>", self.RED)
             else:
-                nice_frac = 10
-        return nice_frac * (10 ** exp)
-    
-    def compute_axis(data_min, data_max, n_ticks):
-        raw_range = data_max - data_min
-        if raw_range == 0:
-            raw_range = abs(data_min) * 0.1 if data_min != 0 else 1
-        
-        raw_tick = raw_range / (n_ticks - 1)
-        tick_interval = nice_number(raw_tick)
-        
-        axis_min = math.floor(data_min / tick_interval) * tick_interval
-        axis_max = math.ceil(data_max / tick_interval) * tick_interval
-        
-        if axis_max == axis_min:
-            axis_max = axis_min + tick_interval
-        
-        return axis_min, axis_max, tick_interval
-    
-    def format_tick(val, tick_interval):
-        if tick_interval >= 1:
-            return f"{val:12.0f}"
-        elif tick_interval >= 0.001:
-            decimals = max(0, min(8, -int(math.floor(math.log10(tick_interval))) + 1))
-            return f"{val:12.{decimals}f}"
-        else:
-            return f"{val:12.8f}"
-    
-    def render():
-        size = shutil.get_terminal_size((80, 24))
-        width, height = size.columns, size.lines
-        content_width = width - 4
-        
-        # Calculate plot dimensions
-        plot_height = height - 10  # Leave room for borders, title, stats
-        plot_width = content_width - 16  # Leave room for wider Y-axis labels (12 chars + padding)
-        num_ticks = min(6, plot_height // 3)
-        
-        lines = []
-        
-        # Top border
-        title = f" {topic}.{field} "
-        left_len = (width - 2 - len(title)) // 2
-        right_len = width - 2 - left_len - len(title)
-        top = f"{BORDER}┏{'━' * left_len}{RESET}{BG_ACCENT}{BOLD}{CYAN}{title}{RESET}{BORDER}{'━' * right_len}┓{RESET}"
-        lines.append(top)
-        
-        # Subtitle
-        subtitle = " Ctrl+C to return "
-        sub_padding = content_width - len(subtitle)
-        left_pad = sub_padding // 2
-        right_pad = sub_padding - left_pad
-        sub_line = f"{BORDER}┃{RESET}{BG_DARK} {' ' * left_pad}{DIM}{GRAY}{subtitle}{RESET}{BG_DARK}{' ' * right_pad} {RESET}{BORDER}┃{RESET}"
-        lines.append(sub_line)
-        
-        # Separator
-        sep = f"{BORDER}┃{RESET}{BG_DARK} {DARK_GRAY}{'─' * content_width}{RESET}{BG_DARK} {RESET}{BORDER}┃{RESET}"
-        lines.append(sep)
-        
-        if len(history) < 2:
-            # Waiting for data
-            for i in range(plot_height):
-                if i == plot_height // 2:
-                    msg = "Waiting for data..."
-                    pad_left = (content_width - len(msg)) // 2
-                    pad_right = content_width - len(msg) - pad_left
-                    line = f"{BORDER}┃{RESET}{BG_DARK} {' ' * pad_left}{GRAY}{msg}{RESET}{BG_DARK}{' ' * pad_right} {RESET}{BORDER}┃{RESET}"
-                else:
-                    line = f"{BORDER}┃{RESET}{BG_DARK} {' ' * content_width} {RESET}{BORDER}┃{RESET}"
-                lines.append(line)
-        else:
-            min_v = min(history)
-            max_v = max(history)
-            y_min, y_max, tick_interval = compute_axis(min_v, max_v, num_ticks)
-            y_range = y_max - y_min if y_max != y_min else 1
-            
-            # Build plot grid
-            grid = [[" " for _ in range(plot_width)] for _ in range(plot_height)]
-            plot_data = history[-plot_width:]
-            
-            for col, val in enumerate(plot_data):
-                offset_col = plot_width - len(plot_data) + col
-                normalized = (val - y_min) / y_range
-                row = int((1 - normalized) * (plot_height - 1))
-                row = max(0, min(plot_height - 1, row))
-                grid[row][offset_col] = "●"
-                
-                if col > 0:
-                    prev_val = plot_data[col - 1]
-                    prev_norm = (prev_val - y_min) / y_range
-                    prev_row = int((1 - prev_norm) * (plot_height - 1))
-                    prev_row = max(0, min(plot_height - 1, prev_row))
-                    
-                    start_row = min(prev_row, row)
-                    end_row = max(prev_row, row)
-                    for r in range(start_row, end_row + 1):
-                        if grid[r][offset_col] == " ":
-                            grid[r][offset_col] = "│"
-            
-            # Render plot rows
-            for row in range(plot_height):
-                y_val = y_max - (row / max(1, plot_height - 1)) * y_range
-                remainder = abs(y_val - y_min) % tick_interval if tick_interval > 0 else 0
-                is_tick = remainder < tick_interval * 0.1 or remainder > tick_interval * 0.9
-                
-                if is_tick:
-                    label = f"{format_tick(y_val, tick_interval)} ┤"
-                else:
-                    label = "             │"
-                
-                row_chars = []
-                for c in grid[row]:
-                    if c == "●":
-                        row_chars.append(f"{GREEN}{c}{RESET}{BG_DARK}")
-                    elif c == "│":
-                        row_chars.append(f"{DARK_GRAY}{c}{RESET}{BG_DARK}")
-                    else:
-                        row_chars.append(c)
-                row_str = "".join(row_chars)
-                
-                padding = content_width - 14 - plot_width
-                line = f"{BORDER}┃{RESET}{BG_DARK} {GRAY}{label}{RESET}{BG_DARK}{row_str}{' ' * max(0, padding)} {RESET}{BORDER}┃{RESET}"
-                lines.append(line)
-        
-        # Bottom axis
-        axis_line = f"             └{'─' * plot_width}"
-        axis_pad = content_width - 14 - plot_width
-        lines.append(f"{BORDER}┃{RESET}{BG_DARK} {GRAY}{axis_line}{RESET}{BG_DARK}{' ' * max(0, axis_pad)} {RESET}{BORDER}┃{RESET}")
-        
-        # Stats separator
-        lines.append(f"{BORDER}┃{RESET}{BG_DARK} {DARK_GRAY}{'─' * content_width}{RESET}{BG_DARK} {RESET}{BORDER}┃{RESET}")
-        
-        # Stats
-        def strip_ansi(text):
-            return re.sub(r'\033\[[0-9;]*m', '', text)
-        
-        if len(history) >= 2:
-            current = history[-1]
-            min_v = min(history)
-            max_v = max(history)
-            avg_v = sum(history) / len(history)
-            
-            stat1 = f"  Current: {current:14.8f}    Samples: {len(history)}"
-            stat1_pad = content_width - len(stat1)
-            stat1_colored = f"  {BOLD}{WHITE}Current:{RESET}{BG_DARK} {YELLOW}{current:14.8f}{RESET}{BG_DARK}    {BOLD}{WHITE}Samples:{RESET}{BG_DARK} {WHITE}{len(history)}{RESET}{BG_DARK}"
-            lines.append(f"{BORDER}┃{RESET}{BG_DARK} {stat1_colored}{' ' * max(0, stat1_pad)} {RESET}{BORDER}┃{RESET}")
-            
-            stat2 = f"  Min: {min_v:14.8f}  Max: {max_v:14.8f}  Avg: {avg_v:14.8f}"
-            stat2_pad = content_width - len(stat2)
-            stat2_colored = f"  {BOLD}{WHITE}Min:{RESET}{BG_DARK} {CYAN}{min_v:14.8f}{RESET}{BG_DARK}  {BOLD}{WHITE}Max:{RESET}{BG_DARK} {CYAN}{max_v:14.8f}{RESET}{BG_DARK}  {BOLD}{WHITE}Avg:{RESET}{BG_DARK} {CYAN}{avg_v:14.8f}{RESET}{BG_DARK}"
-            lines.append(f"{BORDER}┃{RESET}{BG_DARK} {stat2_colored}{' ' * max(0, stat2_pad)} {RESET}{BORDER}┃{RESET}")
-        else:
-            empty = " " * content_width
-            lines.append(f"{BORDER}┃{RESET}{BG_DARK} {empty} {RESET}{BORDER}┃{RESET}")
-            lines.append(f"{BORDER}┃{RESET}{BG_DARK} {empty} {RESET}{BORDER}┃{RESET}")
-        
-        # Bottom border
-        lines.append(f"{BORDER}┗{'━' * (width - 2)}┛{RESET}")
-        
-        output = CLEAR + HOME + "\n".join(lines)
-        sys.stdout.write(output)
-        sys.stdout.flush()
-    
-    def callback(msg):
-        if not state["running"]:
-            return
-        
-        val = getattr(msg, field, None)
-        if val is None or not isinstance(val, (int, float)):
-            return
-        
-        if isinstance(val, bool):
-            return
-            
-        history.append(val)
-        if len(history) > 500:
-            history.pop(0)
-        
-        now = time.time()
-        if now - state["last_render"] >= 0.1:
-            render()
-            state["last_render"] = now
+                self.sleep(seconds)
+            return True
+        return super().process_command(cmd_line)
 
-    sys.stdout.write(HIDE_CURSOR)
-    sys.stdout.flush()
-    
-    bus.subscribe(topic, callback)
-    
-    # Initial render
-    render()
-    
-    # Main loop - check for Ctrl+C and periodically render
-    last_render_time = time.time()
-    try:
-        while state["running"]:
-            if select.select([sys.stdin], [], [], 0.05)[0]:
-                ch = sys.stdin.read(1)
-                if ch == "\x03":
+    def run_script(self, path=None):
+        """Run the script, then wait out the duration. Returns 1 if any command failed."""
+        lines = []
+        if path is not None:
+            try:
+                with open(path) as f:
+                    lines = f.read().splitlines()
+            except OSError as e:
+                self.add_output(f"Cannot read {path}: {e}", self.RED)
+                return 1
+        try:
+            for line in lines:
+                if self.remaining() == 0.0:
                     break
-            
-            now = time.time()
-            if now - last_render_time >= 0.1:
-                render()
-                last_render_time = now
-    finally:
-        state["running"] = False
-        while select.select([sys.stdin], [], [], 0)[0]:
-            sys.stdin.read(1)
-        sys.stdout.write(SHOW_CURSOR)
-        sys.stdout.flush()
-
-
-def main():
+                if not self.process_command(line.split("#", 1)[0].strip()):
+                    return 1 if self.errors else 0
+            remaining = self.remaining()
+            if remaining:
+                sleep(remaining)
+        except KeyboardInterrupt:
+            self.add_output("Interrupted", self.RED)
+        return 1 if self.errors else 0
+
+
+FILTER_RE = re.compile(r"^(\w+)(<=|>=|==|!=|<|>)(.+)$")
+FILTER_OPS = {
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+
+def parse_filter(expr):
+    """Turn 'FIELD<OP>VALUE' (e.g. satellites<10) into a message predicate."""
+    m = FILTER_RE.match(expr.strip("'\""))
+    if m is None:
+        raise ValueError(expr)
+    field, op, raw = m.groups()
+    if raw in ("True", "true", "False", "false"):
+        value = raw in ("True", "true")
+    else:
+        try:
+            value = int(raw)
+        except ValueError:
+            try:
+                value = float(raw)
+            except ValueError:
+                value = raw.strip("'\"")
+    compare = FILTER_OPS[op]
+
+    def predicate(msg):
+        v = getattr(msg, field, None)
+        if v is None:
+            return False
+        try:
+            return bool(compare(v, value))
+        except TypeError:
+            return False
+    return predicate
+
+
+def format_bytes(n):
+    for unit in ("B", "KB", "MB"):
+        if n < 1000:
+            return f"{n:.2f}{unit}"
+        n /= 1000
+    return f"{n:.2f}GB"
+
+
+def main(argv=None):
     global running
     
-    setup_environment()
+    parser = argparse.ArgumentParser(prog="python3 -m src.cli", description="CoolX4 simulation shell")
+    parser.add_argument("--headless", action="store_true", help="run without a terminal UI")
+    parser.add_argument("--imus", type=int, choices=range(1, FilterModule.MAX_IMUS + 1), metavar="N",
+                        help=f"number of IMUs (1-{FilterModule.MAX_IMUS}, default 2)")
+    parser.add_argument("--scenario", nargs="?", const=True, default=False, metavar="FILE",
+                        help="drive GPS and IMUs from a generated moving-vehicle scenario, or from a scenario file")
+    parser.add_argument("--seed", type=int, help="random seed of the scenario")
+    parser.add_argument("--script", metavar="FILE", help="commands to run, one per line (headless)")
+    parser.add_argument("--duration", type=float, metavar="SEC", help="stop after this many seconds (headless)")
+    parser.add_argument("--speed", type=float, metavar="X", help="run the simulation clock X times real time (headless)")
+    args = parser.parse_args(argv)
+    if not args.headless and (args.script or args.duration is not None or args.speed is not None):
+        parser.error("--script, --duration and --speed need --headless")
+    if args.speed is not None and args.speed <= 0:
+        parser.error("--speed must be positive")
+    if args.headless and args.script is None and args.duration is None:
+        parser.error("--headless needs --script or --duration")
+    if args.seed is not None and not args.scenario:
+        parser.error("--seed needs --scenario")
+    
+    scenario = None
+    if isinstance(args.scenario, str):
+        from src.scenario_stream import ScenarioStream, ScenarioError
+        try:
+            scenario = ScenarioStream(args.scenario, seed=args.seed)
+        except (OSError, ScenarioError) as e:
+            parser.error(str(e))
+    elif args.scenario:
+        from src.gps.scenario import GpsScenario
+        scenario = GpsScenario(args.duration or 3600.0, seed=args.seed)
+    if args.imus is not None:
+        set_imu_count(args.imus)
+    if args.speed is not None:
+        set_clock(ScaledClock(args.speed))
+    if not args.headless:
+        setup_environment()
+        load_history()
     
-    sim_thread = threading.Thread(target=simulation_loop)
+    sim_thread = threading.Thread(target=simulation_loop, args=(scenario,))
     sim_thread.daemon = True
     sim_thread.start()
     
-    shell = FullScreenShell()
-    shell.run()
+    if args.headless:
+        shell = HeadlessShell(args.duration)
+        status = shell.run_script(args.script)
+    else:
+        shell = FullScreenShell()
+        shell.run()
+        status = 0
     
-    try:
-        histfile = os.path.join(os.path.expanduser("~"), ".coolx4_history")
-        readline.write_history_file(histfile)
-    except IOError:
-        pass
+    if shell.recorder is not None:
+        shell.cmd_ros_bag_stop([])
+    
+    if not args.headless:
+        save_history()
 
     running = False
     print("\nExiting...")
     sim_thread.join(timeout=1.0)
+    return status
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
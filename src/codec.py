@@ -0,0 +1,62 @@
+"""Compact binary encoding of bus messages, one struct-backed Schema per layout."""
+import struct
+
+from src.core import Message, MessageType
+
+# Import for the side effect of registering the declared schemas
+import src.msgs  # noqa: F401
+
+class Schema:
+    def __init__(self, type_name, fields, format):
+        if len(fields) != len(format):
+            raise ValueError(f"{type_name}: {len(fields)} fields but format '{format}'")
+        self.type_name = type_name
+        self.fields = tuple(fields)
+        self.format = format
+        self.struct = struct.Struct("<" + format)
+        self.size = self.struct.size
+        self.cls = MessageType.registry.get(type_name)
+
+    def matches(self, message):
+        return type(message).__name__ == self.type_name and message.fields() == self.fields
+
+    def pack(self, message):
+        return self.struct.pack(*[getattr(message, name) for name in self.fields])
+
+    def pack_into(self, buffer, offset, message):
+        self.struct.pack_into(buffer, offset, *[getattr(message, name) for name in self.fields])
+
+    def unpack(self, data, offset=0):
+        values = self.struct.unpack_from(data, offset)
+        if self.cls is not None and self.cls.fields() == self.fields:
+            return self.cls(*values)
+        return Message(**dict(zip(self.fields, values)))
+
+_schemas = {}
+
+def value_code(value):
+    if isinstance(value, bool):
+        return "?"
+    if isinstance(value, int):
+        return "q"
+    if isinstance(value, float):
+        return "d"
+    return None
+
+def schema_for(message):
+    """Return the Schema for a message, or None if a field is not bool, int or float."""
+    cls = type(message)
+    schema = _schemas.get(cls)
+    if schema is not None:
+        return schema
+
+    if isinstance(message, MessageType) and cls._format is not None:
+        schema = Schema(cls.__name__, cls.fields(), cls._format)
+        _schemas[cls] = schema
+        return schema
+
+    # Free-form messages can differ per instance, so they are not cached
+    codes = [value_code(v) for _, v in message.items()]
+    if None in codes:
+        return None
+    return Schema(cls.__name__, message.fields(), "".join(codes))
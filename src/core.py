@@ -1,37 +1,492 @@
 import time
 import threading
-from collections import defaultdict
+import traceback
+import types
+import weakref
+from collections import deque
+
+from src.stats import Histogram, RunningStats
 
 class Message:
+    """Free-form message built from keyword arguments; high-rate topics use a MessageType."""
     def __init__(self, **kwargs):
         for k, v in kwargs.items():
             setattr(self, k, v)
+
+    def fields(self):
+        return tuple(self.__dict__)
+
+    def items(self):
+        return list(self.__dict__.items())
     
     def __repr__(self):
         return str(self.__dict__)
 
+class MessageType:
+    """Declared message: fields in __slots__ in constructor order, one struct code per field in _format."""
+    __slots__ = ()
+    _format = None
+    registry = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        MessageType.registry[cls.__name__] = cls
+
+    @classmethod
+    def fields(cls):
+        return cls.__slots__
+
+    def items(self):
+        return [(name, getattr(self, name)) for name in self.__slots__]
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return self.items() == other.items()
+
+    def __repr__(self):
+        return str(dict(self.items()))
+
+class Subscription:
+    """Handle returned by Bus.subscribe. Bound-method callbacks are held weakly by default."""
+    def __init__(self, bus, topic, callback, weak=None, max_rate=None):
+        if max_rate is not None and max_rate <= 0:
+            raise ValueError("max_rate must be positive")
+
+        self.bus = bus
+        self.topic = topic
+        self.active = True
+        self.dropped = 0
+        self.name = callback_name(callback)
+        # Rate cap enforced by Bus.publish (see Bus.subscribe)
+        self.interval = 1.0 / max_rate if max_rate else None
+        self.next_due = 0.0
+        # Set by a filter that rejected the message being published
+        self.rejected = False
+
+        if weak is None:
+            weak = isinstance(callback, types.MethodType)
+
+        if weak:
+            if isinstance(callback, types.MethodType):
+                self._ref = weakref.WeakMethod(callback, self._on_collected)
+            else:
+                self._ref = weakref.ref(callback, self._on_collected)
+            self._target = self._call_weak
+        else:
+            self._ref = None
+            self._target = callback
+
+        # What Bus.publish calls on the publishing thread
+        self.callback = self._target
+
+    def _call_weak(self, message):
+        callback = self._ref()
+        if callback is not None:
+            callback(message)
+
+    def _on_collected(self, ref):
+        # Runs inside the garbage collector, possibly while this thread holds
+        # the bus lock, so leave the removal to the bus (see Bus._prune)
+        self.bus._collected.append(self)
+
+    def add_filter(self, predicate):
+        """Deliver only messages for which predicate(message) is true."""
+        deliver = self.callback
+
+        def filtered(message):
+            if not predicate(message):
+                self.rejected = True
+                return
+            deliver(message)
+
+        self.callback = filtered
+
+    def unsubscribe(self):
+        if self.active:
+            self.active = False
+            self.bus._remove(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.unsubscribe()
+        return False
+
+    def __repr__(self):
+        state = "active" if self.active else "closed"
+        return f"<Subscription {self.topic} {state}>"
+
+class AsyncSubscription(Subscription):
+    """
+    Subscription whose callback runs on its own dispatcher thread.
+    overflow is drop_oldest or keep_latest; lost messages are counted in `dropped`.
+    """
+    POLICIES = ("drop_oldest", "keep_latest")
+
+    def __init__(self, bus, topic, callback, weak=None, queue_size=100, overflow="drop_oldest", max_rate=None):
+        if overflow not in self.POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        if queue_size < 1:
+            raise ValueError("queue_size must be at least 1")
+
+        super().__init__(bus, topic, callback, weak, max_rate)
+        self.overflow = overflow
+
+        maxlen = 1 if overflow == "keep_latest" else queue_size
+        self.queue = deque(maxlen=maxlen)
+        self._cond = threading.Condition()
+        self.callback = self._enqueue
+
+        self._thread = threading.Thread(target=self._dispatch, name=f"bus-{topic}", daemon=True)
+        self._thread.start()
+
+    @property
+    def pending(self):
+        return len(self.queue)
+
+    def _enqueue(self, message):
+        with self._cond:
+            if len(self.queue) == self.queue.maxlen:
+                self.dropped += 1
+            self.queue.append(message)
+            self._cond.notify()
+
+    def _dispatch(self):
+        while True:
+            with self._cond:
+                while self.active and not self.queue:
+                    self._cond.wait()
+                if not self.active:
+                    return
+                message = self.queue.popleft()
+
+            try:
+                self._target(message)
+            except Exception:
+                traceback.print_exc()
+
+    def unsubscribe(self):
+        super().unsubscribe()
+        with self._cond:
+            self.queue.clear()
+            self._cond.notify()
+
+class LatestSubscription(Subscription):
+    """Polls the topic's newest message at max_rate, off the publishing thread."""
+    def __init__(self, bus, topic, callback, weak=None, max_rate=None):
+        if max_rate is None:
+            raise ValueError("keep_latest needs a max_rate")
+
+        super().__init__(bus, topic, callback, weak, max_rate)
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._dispatch, name=f"bus-{topic}", daemon=True)
+        self._thread.start()
+
+    def _dispatch(self):
+        last = None
+        while True:
+            with self._cond:
+                if self.active:
+                    self._cond.wait(self.interval)
+                if not self.active:
+                    return
+
+            message = self.bus.get_last_message(self.topic)
+            if message is None or message is last:
+                continue
+            last = message
+            try:
+                self.callback(message)
+            except Exception:
+                traceback.print_exc()
+
+    def unsubscribe(self):
+        super().unsubscribe()
+        with self._cond:
+            self._cond.notify()
+
+def callback_name(callback):
+    name = getattr(callback, "__qualname__", None) or type(callback).__name__
+    return name.replace("<locals>.", "")
+
+class TopicStats:
+    """Publish profile of one topic, collected while Bus profiling is on."""
+    def __init__(self):
+        self.count = 0
+        self.fanout = RunningStats()
+        self.interarrival = Histogram()
+        self.callbacks = {}
+        self.last_arrival = None
+
+    def arrival(self, now, fanout):
+        self.count += 1
+        self.fanout.add(fanout)
+        if self.last_arrival is not None:
+            self.interarrival.add(now - self.last_arrival)
+        self.last_arrival = now
+
+    def callback_cost(self, sub, cost):
+        hist = self.callbacks.get(sub)
+        if hist is None:
+            hist = self.callbacks[sub] = Histogram()
+        hist.add(cost)
+
+    def subscribers(self):
+        """(name, histogram) for each subscription still attached to the topic."""
+        return [(sub.name, hist) for sub, hist in list(self.callbacks.items()) if sub.active]
+
+class Topic:
+    __slots__ = ("name", "subs", "throttled", "next_due", "pollers", "last", "stats")
+
+    def __init__(self, name):
+        self.name = name
+        self.subs = ()
+        # Rate-capped subscriptions, and the earliest time any of them is due
+        self.throttled = ()
+        self.next_due = 0.0
+        # keep_latest subscriptions; they read `last` on their own thread
+        self.pollers = ()
+        self.last = None
+        self.stats = None
+
+    def subscriptions(self):
+        return self.subs + self.throttled + self.pollers
+
 class Bus:
+    """
+    Process-wide publish/subscribe bus. Subscriber tuples are swapped under a
+    lock; publish reads them without it, so an unsubscribing callback may
+    still get the message in flight.
+    """
     _instance = None
     
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(Bus, cls).__new__(cls)
-            cls._instance.topics = defaultdict(list)
-            cls._instance.last_messages = {}
+            cls._instance.topics = {}
+            cls._instance._lock = threading.Lock()
+            # Subscriptions whose weakly held callback was collected
+            cls._instance._collected = deque()
         return cls._instance
 
+    def _prune(self):
+        collected = self._collected
+        while collected:
+            collected.popleft().unsubscribe()
+
+    def _get_topic(self, name):
+        topic = self.topics.get(name)
+        if topic is None:
+            with self._lock:
+                topic = self.topics.get(name)
+                if topic is None:
+                    topic = Topic(name)
+                    self.topics[name] = topic
+        return topic
+
     def publish(self, topic, message):
-        self.last_messages[topic] = message
-        for callback in self.topics[topic]:
-            callback(message)
+        t = self.topics.get(topic)
+        if t is None:
+            t = self._get_topic(topic)
+        t.last = message
+        for sub in t.subs:
+            sub.callback(message)
+        if t.throttled:
+            now = time.monotonic()
+            if now >= t.next_due:
+                self._publish_throttled(t, message, now)
+
+    def _publish_throttled(self, t, message, now, stats=None):
+        """Deliver to the rate-capped subscriptions that are due."""
+        next_due = float("inf")
+        for sub in t.throttled:
+            if now >= sub.next_due:
+                sub.rejected = False
+                if stats is None:
+                    sub.callback(message)
+                else:
+                    t0 = time.perf_counter()
+                    sub.callback(message)
+                    stats.callback_cost(sub, time.perf_counter() - t0)
+                if not sub.rejected:
+                    sub.next_due += sub.interval
+                    if sub.next_due <= now:
+                        sub.next_due = now + sub.interval
+            if sub.next_due < next_due:
+                next_due = sub.next_due
+        t.next_due = next_due
+
+    def _publish_profiled(self, topic, message):
+        t = self.topics.get(topic)
+        if t is None:
+            t = self._get_topic(topic)
+        t.last = message
+        stats = t.stats
+        if stats is None:
+            stats = t.stats = TopicStats()
+
+        subs = t.subs
+        clock = time.perf_counter
+        stats.arrival(clock(), len(subs))
+        for sub in subs:
+            t0 = clock()
+            sub.callback(message)
+            stats.callback_cost(sub, clock() - t0)
+        if t.throttled:
+            now = time.monotonic()
+            if now >= t.next_due:
+                self._publish_throttled(t, message, now, stats)
+
+    @property
+    def profiling(self):
+        return "publish" in self.__dict__
+
+    def set_profiling(self, enabled):
+        """Switch per-topic publish profiling on or off and return the previous state."""
+        previous = self.profiling
+        if enabled and not previous:
+            for t in list(self.topics.values()):
+                t.stats = None
+            self.publish = self._publish_profiled
+        elif not enabled and previous:
+            del self.publish
+        return previous
+
+    def topic_stats(self):
+        with self._lock:
+            return {name: t.stats for name, t in self.topics.items() if t.stats is not None}
 
-    def subscribe(self, topic, callback):
-        self.topics[topic].append(callback)
+    def subscribe(self, topic, callback, weak=None, queue_size=None, overflow="drop_oldest", filter=None,
+                  max_rate=None, keep_latest=False):
+        """
+        Register callback for messages on topic and return its Subscription.
+        queue_size delivers on a dispatcher thread, max_rate caps deliveries per
+        second and keep_latest polls the newest message at max_rate instead.
+        """
+        if keep_latest:
+            sub = LatestSubscription(self, topic, callback, weak, max_rate)
+        elif queue_size is None:
+            sub = Subscription(self, topic, callback, weak, max_rate)
+        else:
+            sub = AsyncSubscription(self, topic, callback, weak, queue_size, overflow, max_rate)
+        if filter is not None:
+            sub.add_filter(filter)
+        self._prune()
+        t = self._get_topic(topic)
+        with self._lock:
+            if keep_latest:
+                t.pollers = t.pollers + (sub,)
+            elif sub.interval:
+                t.throttled = t.throttled + (sub,)
+                t.next_due = 0.0
+            else:
+                t.subs = t.subs + (sub,)
+        return sub
+
+    def _remove(self, sub):
+        t = self.topics.get(sub.topic)
+        if t is None:
+            return
+        with self._lock:
+            if sub in t.subs:
+                t.subs = tuple(s for s in t.subs if s is not sub)
+            elif sub in t.throttled:
+                t.throttled = tuple(s for s in t.throttled if s is not sub)
+                t.next_due = 0.0
+            elif sub in t.pollers:
+                t.pollers = tuple(s for s in t.pollers if s is not sub)
+
+    def subscriber_count(self, topic):
+        self._prune()
+        t = self.topics.get(topic)
+        return len(t.subscriptions()) if t else 0
+
+    def subscriber_counts(self):
+        self._prune()
+        with self._lock:
+            counts = {name: len(t.subscriptions()) for name, t in self.topics.items()}
+        return {name: n for name, n in counts.items() if n}
+
+    def dropped_counts(self):
+        self._prune()
+        with self._lock:
+            topics = list(self.topics.items())
+        counts = {}
+        for name, t in topics:
+            dropped = sum(sub.dropped for sub in t.subscriptions())
+            if dropped:
+                counts[name] = dropped
+        return counts
+
+    def topic_names(self):
+        with self._lock:
+            return [name for name, t in self.topics.items() if t.last is not None]
 
     def get_last_message(self, topic):
-        return self.last_messages.get(topic)
+        t = self.topics.get(topic)
+        return t.last if t else None
 
 bus = Bus()
 
+class RealTimeClock:
+    def now(self):
+        return time.time()
+
+    def sleep(self, dt):
+        time.sleep(dt)
+
+class ScaledClock:
+    """Runs `scale` times faster (or slower) than wall clock."""
+    def __init__(self, scale, start=None):
+        if scale <= 0:
+            raise ValueError("scale must be positive")
+        self.scale = scale
+        self.wall_origin = time.time()
+        self.origin = self.wall_origin if start is None else start
+
+    def now(self):
+        return self.origin + (time.time() - self.wall_origin) * self.scale
+
+    def sleep(self, dt):
+        time.sleep(dt / self.scale)
+
+class VirtualClock:
+    """
+    Clock that only moves when told to. sleep() advances time instantly,
+    so a loop driven by it runs as fast as the CPU allows.
+    """
+    def __init__(self, start=0.0):
+        self.time = start
+
+    def now(self):
+        return self.time
+
+    def set(self, t):
+        self.time = t
+
+    def advance(self, dt):
+        self.time += dt
+
+    def sleep(self, dt):
+        if dt > 0:
+            self.time += dt
+
+_clock = RealTimeClock()
+
+def set_clock(clock):
+    """Install the clock used by get_time_sec and sleep, returning the previous one."""
+    global _clock
+    previous = _clock
+    _clock = clock
+    return previous
+
+def get_clock():
+    return _clock
+
 def get_time_sec():
-    return time.time()
+    return _clock.now()
+
+def sleep(dt):
+    _clock.sleep(dt)
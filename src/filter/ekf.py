@@ -0,0 +1,114 @@
+import numpy as np
+
+GRAVITY = 9.81
+
+class ErrorStateEKF:
+    """Error-state Kalman filter over ENU position, velocity and accelerometer bias."""
+    def __init__(self, accel_noise=0.5, bias_noise=0.01, pos_std=10.0, vel_std=1.0, bias_std=0.2):
+        self.x = np.zeros(9)
+        self.pos = self.x[0:3]
+        self.vel = self.x[3:6]
+        self.bias = self.x[6:9]
+
+        self.P = np.zeros((9, 9))
+        self.P0 = np.array([pos_std ** 2] * 3 + [vel_std ** 2] * 3 + [bias_std ** 2] * 3)
+        # Process noise added per second of prediction
+        self.q_rate = np.array([0.0] * 3 + [accel_noise ** 2] * 3 + [bias_noise ** 2] * 3)
+
+        self.F = np.eye(9)
+        self.FT = self.F.T
+
+        # Scratch space and views, kept so the hot paths only fill them in
+        self.PT = self.P.T
+        self.P_diag = self.P.reshape(81)[::10]
+        self.P_rows = [self.P[i] for i in range(3)]
+        self.tmp = np.empty((9, 9))
+        self.q = np.empty(9)
+        self.accel = np.empty(3)
+        self.step3 = np.empty(3)
+        self.gain = np.empty(9)
+        self.dx = np.empty(9)
+        self.row = np.empty(9)
+        self.gain_col = self.gain[:, None]
+        self.row_row = self.row[None, :]
+
+        self.reset()
+
+    def reset(self, east=0.0, north=0.0, up=0.0):
+        self.x.fill(0.0)
+        self.pos[0] = east
+        self.pos[1] = north
+        self.pos[2] = up
+        self.P.fill(0.0)
+        self.P_diag[:] = self.P0
+
+    def predict(self, ax, ay, az, dt):
+        """Propagate dt seconds with a measured acceleration in m/s^2 (ENU, gravity included)."""
+        if dt <= 0:
+            return
+        a = self.accel
+        a[0] = ax
+        a[1] = ay
+        a[2] = az - GRAVITY
+        a -= self.bias
+
+        # p += v dt + a dt^2 / 2, v += a dt
+        np.multiply(self.vel, dt, out=self.step3)
+        self.pos += self.step3
+        np.multiply(a, 0.5 * dt * dt, out=self.step3)
+        self.pos += self.step3
+        np.multiply(a, dt, out=self.step3)
+        self.vel += self.step3
+
+        self.propagate(dt)
+
+    def predict_delta(self, dv_x, dv_y, dv_z, dp_x, dp_y, dp_z, dt):
+        """Propagate dt seconds with pre-integrated deltas (gravity included)."""
+        if dt <= 0:
+            return
+        bias = self.bias
+        vel = self.vel
+        pos = self.pos
+        half = 0.5 * dt * dt
+        bx = float(bias[0])
+        by = float(bias[1])
+        bz = float(bias[2]) + GRAVITY
+        pos[0] += float(vel[0]) * dt + dp_x - bx * half
+        pos[1] += float(vel[1]) * dt + dp_y - by * half
+        pos[2] += float(vel[2]) * dt + dp_z - bz * half
+        vel[0] += dv_x - bx * dt
+        vel[1] += dv_y - by * dt
+        vel[2] += dv_z - bz * dt
+
+        self.propagate(dt)
+
+    def propagate(self, dt):
+        """P = F P F^T + Q dt for the constant-acceleration error model."""
+        F = self.F
+        for i in range(3):
+            F[i, i + 3] = dt
+            F[i + 3, i + 6] = -dt
+        np.matmul(F, self.P, out=self.tmp)
+        np.matmul(self.tmp, self.FT, out=self.P)
+        np.multiply(self.q_rate, dt, out=self.q)
+        self.P_diag += self.q
+
+    def update_position(self, east, north, up, sigma):
+        """Fuse a position fix with standard deviation sigma metres on each axis."""
+        r = sigma * sigma
+        for i, z in enumerate((east, north, up)):
+            innovation = z - self.x[i]
+            s = self.P[i, i] + r
+
+            np.divide(self.P_rows[i], s, out=self.gain)
+            np.multiply(self.gain, innovation, out=self.dx)
+            self.x += self.dx
+
+            # P -= K P[i, :]
+            self.row[:] = self.P_rows[i]
+            np.multiply(self.gain_col, self.row_row, out=self.tmp)
+            self.P -= self.tmp
+
+        # Keep P symmetric against rounding
+        np.add(self.P, self.PT, out=self.tmp)
+        np.multiply(self.tmp, 0.5, out=self.P)
@@ -1,23 +1,61 @@
+import math
+
 from src.params import param_server
-from src.core import bus, Message, get_time_sec
+from src.core import bus, get_time_sec
+from src.msgs import VehicleGlobalPosition, ImuBatch
+from src.filter.preintegration import ImuPreintegrator
+from src.filter.fusion import FusionBuffer, OutputPredictor
+
+def imu_topic_names(count):
+    return tuple(f"imu_{n}" for n in range(1, count + 1))
+
+def imu_fuse_bit(index):
+    """FILTER_FUSE_SRC bit enabling the IMU at index (imu_{index + 1})."""
+    if index < len(FilterModule.IMU_FUSE_BITS):
+        return FilterModule.IMU_FUSE_BITS[index]
+    return 1 << (index + 1)
 
 class FilterModule:
-    def __init__(self):
+    # FILTER_MODE values
+    MODE_DEFAULT = 0
+    MODE_EKF = 1
+    MODE_EKF_DELAYED = 2
+
+    # EKF modes report dead reckoning once no fix has been fused for this long
+    GPS_TIMEOUT = 2.0
+    # Floor on the reported GPS uncertainty, in metres
+    MIN_GPS_SIGMA = 0.05
+    # How far the delayed EKF runs behind real time, so late fixes still fit
+    FUSION_DELAY = 0.2
+    # FILTER_FUSE_SRC bits of imu_1 and imu_2; imu_n for n >= 3 uses bit n,
+    # up to the top bit of the 16-bit mask
+    IMU_FUSE_BITS = (4, 2)
+    MAX_IMUS = 15
+
+    def __init__(self, imu_topics=None):
         self.last_gps_time = 0
         self.last_gps_msg = None
         self.dead_reckoning = True
         
+        if imu_topics is None:
+            imu_topics = imu_topic_names(param_server.get_param("IMU_COUNT"))
+        self.imu_topics = tuple(imu_topics)
+        self.imu_bits = tuple(imu_fuse_bit(i) for i in range(len(self.imu_topics)))
+
+        # IMU samples since the last step, pre-integrated per IMU
+        self.imus = [ImuPreintegrator() for _ in self.imu_topics]
+
         bus.subscribe("gps_position", self.gps_callback)
-        bus.subscribe("imu_1", self.imu1_callback)
-        bus.subscribe("imu_2", self.imu2_callback)
+        for topic, imu in zip(self.imu_topics, self.imus):
+            bus.subscribe(topic, imu.add_message)
         
         self.lat = 37.7749
         self.lon = -122.4194
         self.alt = 100.0
         self.gps_sats = 0 
         
-        self.imu1_msg = None
-        self.imu2_msg = None
+        # ImuVoter once three or more IMUs are fused
+        self.voter = None
         
         # Filtered acceleration 
         self.accel_x = 0.0
@@ -31,50 +69,118 @@ class FilterModule:
         self.last_step_time = get_time_sec() # Time tracking for integration
         self.meters_to_deg = 1.0 / 111000.0 # Convert meters to degrees for lat/lon
 
+        # EKF modes
+        self.ekf = None
+        self.origin = (self.lat, self.lon, self.alt)
+        self.lon_scale = math.cos(math.radians(self.lat))
+        self.fused_gps_msg = None
+        self.last_fused_time = None
+
+        # Delayed EKF mode: fusion buffers, and the index of the IMU whose
+        # samples drive the output predictor (None outside that mode)
+        self.fusion = FusionBuffer()
+        self.predictor = OutputPredictor()
+        self.output_imu = None
+        self.output_sub = None
+        self.output_published = False
+        self.imu_time = None
+
     def gps_callback(self, msg):
         self.last_gps_msg = msg
         self.last_gps_time = msg.timestamp
         self.gps_sats = getattr(msg, 'satellites', 0)
+        if self.output_imu is not None:
+            self.fusion.add_gps(msg)
 
-    def imu1_callback(self, msg):
-        self.imu1_msg = msg
-        self.run_filter_step()
+    def set_output_imu(self, index):
+        if index == self.output_imu:
+            return
+        if self.output_sub is not None:
+            self.output_sub.unsubscribe()
+            self.output_sub = None
+        self.output_imu = index
+        if index is not None:
+            self.output_sub = bus.subscribe(self.imu_topics[index], self.publish_output)
 
-    def imu2_callback(self, msg):
-        self.imu2_msg = msg
-        self.run_filter_step()
-        
-    def run_filter_step(self):
+    def imu_healthy(self, index):
+        return self.voter is None or bool(self.voter.healthy[index])
+
+    def take_imu_delta(self):
+        """
+        Combine and reset the deltas of the IMUs enabled in FILTER_FUSE_SRC.
+        Returns (dv_x, dv_y, dv_z, dp_x, dp_y, dp_z, duration), or None if no
+        enabled IMU has a new sample.
+        """
         fuse_src = param_server.get_param("FILTER_FUSE_SRC")
-        fuse_imu2 = (fuse_src & 2) == 2
-        fuse_imu1 = (fuse_src & 4) == 4
-        
-        ax_sum = 0.0
-        ay_sum = 0.0
-        az_sum = 0.0
-        count = 0
-        
-        if fuse_imu1 and self.imu1_msg:
-            ax_sum += self.imu1_msg.accel_x
-            ay_sum += self.imu1_msg.accel_y
-            az_sum += self.imu1_msg.accel_z
-            count += 1
-            
-        if fuse_imu2 and self.imu2_msg:
-            ax_sum += self.imu2_msg.accel_x
-            ay_sum += self.imu2_msg.accel_y
-            az_sum += self.imu2_msg.accel_z
-            count += 1
-            
-        if count > 0:
-            self.accel_x = ax_sum / count
-            self.accel_y = ay_sum / count
-            self.accel_z = az_sum / count
+        used = [i for i, (imu, bit) in enumerate(zip(self.imus, self.imu_bits)) if fuse_src & bit and imu.count]
+        if len(used) >= 3:
+            delta = self.vote_imu_delta(used)
+        else:
+            delta = self.mean_imu_delta(used)
+        for imu in self.imus:
+            imu.reset()
+        if delta is None:
+            return None
+
+        # Mean acceleration over the interval, as published
+        dv_x, dv_y, dv_z, _, _, _, duration = delta
+        self.accel_x = dv_x / duration
+        self.accel_y = dv_y / duration
+        self.accel_z = dv_z / duration
+        return delta
+
+    def vote_imu_delta(self, used):
+        if self.voter is None:
+            from src.filter.imu_vote import ImuVoter
+            self.voter = ImuVoter(len(self.imus))
+        voter = self.voter
+        deltas = voter.deltas
+        mask = voter.mask
+        mask[:] = False
+        for i in used:
+            imu = self.imus[i]
+            deltas[i] = (imu.dv_x, imu.dv_y, imu.dv_z, imu.dp_x, imu.dp_y, imu.dp_z, imu.duration)
+            mask[i] = True
+        delta = voter.vote(mask)
+        for i in used:
+            if voter.healthy[i] and (self.imu_time is None or self.imus[i].last_time > self.imu_time):
+                self.imu_time = self.imus[i].last_time
+        return delta
+
+    def mean_imu_delta(self, used):
+        dv_x = dv_y = dv_z = dp_x = dp_y = dp_z = duration = 0.0
+        # Too few to vote: leave out isolated units while any other reports
+        used = [i for i in used if self.imu_healthy(i)] or used
+        n = len(used)
+        if n == 0:
+            return None
+        for i in used:
+            imu = self.imus[i]
+            if self.imu_time is None or imu.last_time > self.imu_time:
+                self.imu_time = imu.last_time
+            dv_x += imu.dv_x
+            dv_y += imu.dv_y
+            dv_z += imu.dv_z
+            dp_x += imu.dp_x
+            dp_y += imu.dp_y
+            dp_z += imu.dp_z
+            duration += imu.duration
+        return (dv_x / n, dv_y / n, dv_z / n, dp_x / n, dp_y / n, dp_z / n, duration / n)
 
     def step(self):
+        mode = param_server.get_param("FILTER_MODE")
+        if mode == self.MODE_EKF_DELAYED:
+            self.step_delayed()
+            return
+        self.set_output_imu(None)
+        if mode == self.MODE_EKF:
+            self.step_ekf()
+            return
+
         now = get_time_sec()
         dt = now - self.last_step_time
         self.last_step_time = now
+        delta = self.take_imu_delta()
         
         fuse_src = param_server.get_param("FILTER_FUSE_SRC")
         fuse_gps = (fuse_src & 1) == 1
@@ -101,24 +207,166 @@ class FilterModule:
             self.dead_reckoning = False
         else:
             self.dead_reckoning = True
-            # Integrate acceleration to velocity
-            self.vel_x += self.accel_x * dt
-            self.vel_y += self.accel_y * dt
-            self.vel_z += (self.accel_z - 9.81) * dt
+            if delta is not None:
+                # Apply the pre-integrated IMU samples
+                dv_x, dv_y, dv_z, dp_x, dp_y, dp_z, dt = delta
+                dp_z -= 0.5 * 9.81 * dt * dt
+                dv_z -= 9.81 * dt
+            else:
+                # No new samples: hold the last acceleration
+                dv_x = self.accel_x * dt
+                dv_y = self.accel_y * dt
+                dv_z = (self.accel_z - 9.81) * dt
+                dp_x = dp_y = dp_z = 0.0
             
             # Integrate velocity to position
-            self.lat += self.vel_y * dt * self.meters_to_deg
-            self.lon += self.vel_x * dt * self.meters_to_deg
-            self.alt += self.vel_z * dt
+            self.lat += (self.vel_y * dt + dp_y) * self.meters_to_deg
+            self.lon += (self.vel_x * dt + dp_x) * self.meters_to_deg
+            self.alt += self.vel_z * dt + dp_z
+            
+            # Integrate acceleration to velocity
+            self.vel_x += dv_x
+            self.vel_y += dv_y
+            self.vel_z += dv_z
         
-        msg = Message(
-            lat=self.lat,
-            lon=self.lon,
-            alt=self.alt,
-            accel_x=self.accel_x,
-            accel_y=self.accel_y,
-            accel_z=self.accel_z,
-            dead_reckoning=self.dead_reckoning,
-            timestamp=now
+        msg = VehicleGlobalPosition(
+            self.lat,
+            self.lon,
+            self.alt,
+            self.accel_x,
+            self.accel_y,
+            self.accel_z,
+            self.dead_reckoning,
+            now
+        )
+        bus.publish("vehicle_global_position", msg)
+
+    def to_local(self, lat, lon, alt):
+        lat0, lon0, alt0 = self.origin
+        return ((lon - lon0) * self.lon_scale / self.meters_to_deg,
+                (lat - lat0) / self.meters_to_deg,
+                alt - alt0)
+
+    def to_global(self, east, north, up):
+        lat0, lon0, alt0 = self.origin
+        return (lat0 + north * self.meters_to_deg,
+                lon0 + east * self.meters_to_deg / self.lon_scale,
+                alt0 + up)
+
+    def get_ekf(self):
+        if self.ekf is None:
+            from src.filter.ekf import ErrorStateEKF
+            self.ekf = ErrorStateEKF()
+        return self.ekf
+
+    def fuse_gps(self, msg):
+        """Fuse one fix into the EKF, weighted by the uncertainty it reports."""
+        if not param_server.get_param("FILTER_FUSE_SRC") & 1:
+            return
+        if msg.satellites < param_server.get_param("MIN_GPS_SAT_VAL"):
+            return
+        east, north, up = self.to_local(msg.lat, msg.lon, msg.alt)
+        if self.last_fused_time is None:
+            self.ekf.reset(east, north, up)
+        else:
+            self.ekf.update_position(east, north, up, max(msg.uncertainty, self.MIN_GPS_SIGMA))
+        self.last_fused_time = msg.timestamp
+
+    def step_ekf(self):
+        now = get_time_sec()
+        dt = now - self.last_step_time
+        self.last_step_time = now
+
+        ekf = self.get_ekf()
+        delta = self.take_imu_delta()
+        if delta is not None:
+            ekf.predict_delta(*delta)
+        else:
+            ekf.predict(self.accel_x, self.accel_y, self.accel_z, dt)
+
+        # Each fix is fused once
+        msg = self.last_gps_msg
+        if msg is not None and msg is not self.fused_gps_msg:
+            self.fused_gps_msg = msg
+            self.fuse_gps(msg)
+
+        self.dead_reckoning = self.last_fused_time is None or now - self.last_fused_time > self.GPS_TIMEOUT
+        pos = ekf.pos
+        self.lat, self.lon, self.alt = self.to_global(float(pos[0]), float(pos[1]), float(pos[2]))
+
+        msg = VehicleGlobalPosition(
+            self.lat,
+            self.lon,
+            self.alt,
+            self.accel_x,
+            self.accel_y,
+            self.accel_z,
+            self.dead_reckoning,
+            now
+        )
+        bus.publish("vehicle_global_position", msg)
+
+    def step_delayed(self):
+        """EKF fused FUSION_DELAY behind real time; the output predictor publishes in between."""
+        now = get_time_sec()
+        dt = now - self.last_step_time
+        self.last_step_time = now
+
+        fuse_src = param_server.get_param("FILTER_FUSE_SRC")
+        if self.output_imu is None and fuse_src & 1 and self.last_gps_msg is not None:
+            # Entering the mode: the newest fix has not been buffered yet
+            self.fusion.add_gps(self.last_gps_msg)
+        ekf = self.get_ekf()
+        delta = self.take_imu_delta()
+        self.set_output_imu(next((i for i, bit in enumerate(self.imu_bits)
+                                  if fuse_src & bit and self.imu_healthy(i)), None))
+        if delta is not None:
+            self.fusion.add_imu(self.imu_time - delta[6], self.imu_time, delta)
+
+        first_fix = self.last_fused_time is None
+        ekf_time = self.fusion.advance(now - self.FUSION_DELAY, ekf.predict_delta, self.fuse_gps)
+
+        predictor = self.predictor
+        if ekf_time is not None:
+            state = (ekf.pos.tolist(), ekf.vel.tolist(), ekf.bias.tolist())
+            if predictor.time is None or (first_fix and self.last_fused_time is not None):
+                predictor.reset(ekf_time, *state)
+            else:
+                predictor.correct(ekf_time, *state, dt)
+            self.dead_reckoning = (self.last_fused_time is None
+                                   or ekf_time - self.last_fused_time > self.GPS_TIMEOUT)
+
+        if not self.output_published:
+            # No IMU sample drove an output since the last step
+            self.publish_position(now)
+        self.output_published = False
+
+    def publish_output(self, msg):
+        """Propagate the output predictor with one IMU message and publish."""
+        if isinstance(msg, ImuBatch):
+            ax, ay, az = msg.accel.mean(axis=0).tolist()
+        else:
+            ax, ay, az = msg.accel_x, msg.accel_y, msg.accel_z
+        if not self.predictor.propagate(msg.timestamp, ax, ay, az):
+            return
+        self.accel_x = ax
+        self.accel_y = ay
+        self.accel_z = az
+        self.publish_position(msg.timestamp)
+        self.output_published = True
+
+    def publish_position(self, t):
+        if self.predictor.time is not None:
+            self.lat, self.lon, self.alt = self.to_global(*self.predictor.position())
+
+        msg = VehicleGlobalPosition(
+            self.lat,
+            self.lon,
+            self.alt,
+            self.accel_x,
+            self.accel_y,
+            self.accel_z,
+            self.dead_reckoning,
+            t
         )
         bus.publish("vehicle_global_position", msg)
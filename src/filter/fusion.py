@@ -0,0 +1,122 @@
+from collections import deque
+
+GRAVITY = 9.81
+
+class FusionBuffer:
+    """
+    IMU chunks and GPS fixes in time order, so each fix is fused at its own
+    timestamp. Fixes older than the state are fused at the state time.
+    """
+    def __init__(self, imu_size=256, gps_size=32):
+        self.imu = deque(maxlen=imu_size)
+        self.gps = deque(maxlen=gps_size)
+        self.time = None
+
+    def add_imu(self, start, end, delta):
+        self.imu.append((start, end, delta))
+
+    def add_gps(self, msg):
+        gps = self.gps
+        gps.append(msg)
+        if len(gps) > 1 and gps[-2].timestamp > msg.timestamp:
+            ordered = sorted(gps, key=lambda m: m.timestamp)
+            gps.clear()
+            gps.extend(ordered)
+
+    def advance(self, horizon, predict, fuse):
+        """
+        Predict and fuse in time order up to the last IMU chunk ending by horizon.
+        Returns the new state time.
+        """
+        imu = self.imu
+        gps = self.gps
+        while imu and imu[0][1] <= horizon:
+            start, end, delta = imu.popleft()
+            if self.time is None:
+                self.time = start
+            # Chunks follow on from each other; absorb any small gap or overlap
+            start = self.time
+            span = end - start
+            done = 0.0
+
+            while gps and gps[0].timestamp <= end:
+                msg = gps.popleft()
+                if msg.timestamp > self.time and span > 0:
+                    part = (msg.timestamp - start) / span
+                    self._predict_part(predict, delta, part - done)
+                    done = part
+                    self.time = msg.timestamp
+                fuse(msg)
+
+            self._predict_part(predict, delta, 1.0 - done)
+            self.time = end
+        return self.time
+
+    def _predict_part(self, predict, delta, part):
+        if part <= 0:
+            return
+        dv_x, dv_y, dv_z, dp_x, dp_y, dp_z, dt = delta
+        sq = part * part
+        predict(dv_x * part, dv_y * part, dv_z * part, dp_x * sq, dp_y * sq, dp_z * sq, dt * part)
+
+class OutputPredictor:
+    """
+    Carries the delayed filter state forward to the newest IMU sample,
+    pulled toward the filter at every step.
+    """
+    def __init__(self, tau=0.25, history=512):
+        self.tau = tau
+        self.history = deque(maxlen=history)
+        self.time = None
+
+    def reset(self, t, pos, vel, bias):
+        self.time = t
+        self.px, self.py, self.pz = pos
+        self.vx, self.vy, self.vz = vel
+        self.bx, self.by, self.bz = bias
+        self.cpx = self.cpy = self.cpz = 0.0
+        self.cvx = self.cvy = self.cvz = 0.0
+        self.history.clear()
+        self.history.append((t, self.px, self.py, self.pz, self.vx, self.vy, self.vz))
+
+    def propagate(self, t, ax, ay, az):
+        """Integrate one sample; False when t is not newer than the last one."""
+        if self.time is None or t <= self.time:
+            return False
+        dt = t - self.time
+        self.time = t
+        ax -= self.bx
+        ay -= self.by
+        az -= self.bz + GRAVITY
+        half = 0.5 * dt * dt
+        vx = self.vx + self.cvx
+        vy = self.vy + self.cvy
+        vz = self.vz + self.cvz
+        self.px += vx * dt + ax * half
+        self.py += vy * dt + ay * half
+        self.pz += vz * dt + az * half
+        self.vx += ax * dt
+        self.vy += ay * dt
+        self.vz += az * dt
+        self.history.append((t, self.px, self.py, self.pz, self.vx, self.vy, self.vz))
+        return True
+
+    def position(self):
+        return self.px + self.cpx, self.py + self.cpy, self.pz + self.cpz
+
+    def correct(self, t, pos, vel, bias, dt):
+        """Pull toward the filter state pos, vel at time t."""
+        self.bx, self.by, self.bz = bias
+        history = self.history
+        while len(history) > 1 and history[1][0] <= t:
+            history.popleft()
+        if not history or history[0][0] > t:
+            return
+        _, px, py, pz, vx, vy, vz = history[0]
+        gain = min(1.0, dt / self.tau)
+        self.cpx += gain * (pos[0] - px - self.cpx)
+        self.cpy += gain * (pos[1] - py - self.cpy)
+        self.cpz += gain * (pos[2] - pz - self.cpz)
+        self.cvx += gain * (vel[0] - vx - self.cvx)
+        self.cvy += gain * (vel[1] - vy - self.cvy)
+        self.cvz += gain * (vel[2] - vz - self.cvz)
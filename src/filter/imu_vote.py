@@ -0,0 +1,76 @@
+import numpy as np
+
+class ImuVoter:
+    """
+    Votes the pre-integrated deltas of three or more IMUs. A unit far from
+    the per-axis median for fault_steps steps is isolated until it agrees
+    again for recover_steps steps.
+    """
+    def __init__(self, count, fault_accel=1.0, fault_steps=5, recover_steps=50):
+        self.fault_accel = fault_accel
+        self.fault_accel2 = fault_accel * fault_accel
+        self.fault_steps = fault_steps
+        self.recover_steps = recover_steps
+        self.deltas = np.zeros((count, 7))
+        self.deltas[:, 6] = 1.0
+        self.duration2 = np.empty(count)
+        self.residual = np.zeros(count)
+        self.mask = np.zeros(count, dtype=bool)
+        self.dv = np.empty((count, 3))
+        self.weight = np.empty(count)
+        self.healthy = np.ones(count, dtype=bool)
+        self.bad = np.zeros(count, dtype=np.int64)
+        self.good = np.zeros(count, dtype=np.int64)
+        self.isolations = 0
+
+    def vote(self, mask):
+        """Fuse the rows of deltas selected by mask and update unit health."""
+        d = self.deltas
+        n = int(np.count_nonzero(mask))
+        partial = n < len(d)
+
+        # Per-axis median of the reporting units; the others sort last as NaN
+        dv = self.dv
+        np.copyto(dv, d[:, :3])
+        if partial:
+            dv[~mask] = np.nan
+        dv.sort(axis=0)
+        median = dv[(n - 1) // 2]
+        if not n & 1:
+            median = 0.5 * (median + dv[n // 2])
+
+        residual = self.residual
+        np.subtract(d[:, :3], median, out=dv)
+        dv *= dv
+        dv.sum(axis=1, out=residual)
+        np.square(d[:, 6], out=self.duration2)
+        residual /= self.duration2
+        bad = residual > self.fault_accel2
+        if partial:
+            bad &= mask
+            keep = ~mask
+            self.bad *= bad | keep
+            self.good *= ~bad | keep
+            self.good += mask & ~bad
+        else:
+            self.bad *= bad
+            self.good *= ~bad
+            self.good += ~bad
+        self.bad += bad
+
+        if bad.any():
+            failed = self.healthy & (self.bad >= self.fault_steps)
+            if failed.any():
+                self.isolations += int(np.count_nonzero(failed))
+                self.healthy[failed] = False
+        if not self.healthy.all():
+            self.healthy |= self.good >= self.recover_steps
+
+        w = self.weight
+        np.divide(residual, self.fault_accel2, out=w)
+        w += 1.0
+        use = mask & self.healthy
+        if not use.any():
+            use = mask
+        np.divide(use, w, out=w)
+        return tuple((w @ d / w.sum()).tolist())
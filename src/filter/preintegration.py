@@ -0,0 +1,65 @@
+from src.msgs import ImuBatch
+
+class ImuPreintegrator:
+    """Accumulates one IMU's velocity and position deltas between two filter steps."""
+    def __init__(self):
+        self.last_time = None
+        self.reset()
+
+    def reset(self):
+        self.dv_x = 0.0
+        self.dv_y = 0.0
+        self.dv_z = 0.0
+        self.dp_x = 0.0
+        self.dp_y = 0.0
+        self.dp_z = 0.0
+        self.duration = 0.0
+        self.count = 0
+
+    def add(self, ax, ay, az, t):
+        last = self.last_time
+        self.last_time = t
+        if last is None or t <= last:
+            return
+        dt = t - last
+        half = 0.5 * dt * dt
+        self.dp_x += self.dv_x * dt + ax * half
+        self.dp_y += self.dv_y * dt + ay * half
+        self.dp_z += self.dv_z * dt + az * half
+        self.dv_x += ax * dt
+        self.dv_y += ay * dt
+        self.dv_z += az * dt
+        self.duration += dt
+        self.count += 1
+
+    def add_block(self, accel, times):
+        """Integrate an (n, 3) NumPy block of samples taken at times (n,)."""
+        if not len(times):
+            return
+        start = times[0] if self.last_time is None else self.last_time
+        dts = times.copy()
+        dts[1:] -= times[:-1]
+        dts[0] -= start
+        dts.clip(min=0.0, out=dts)
+        w = dts[:, None]
+        a_dt = accel * w
+        cum = a_dt.cumsum(axis=0)
+        dp_x, dp_y, dp_z = ((cum - 0.5 * a_dt) * w).sum(axis=0).tolist()
+        dv_x, dv_y, dv_z = cum[-1].tolist()
+        total = float(dts.sum())
+
+        self.dp_x += self.dv_x * total + dp_x
+        self.dp_y += self.dv_y * total + dp_y
+        self.dp_z += self.dv_z * total + dp_z
+        self.dv_x += dv_x
+        self.dv_y += dv_y
+        self.dv_z += dv_z
+        self.duration += total
+        self.count += int((dts > 0).sum())
+        self.last_time = float(times[-1])
+
+    def add_message(self, msg):
+        if isinstance(msg, ImuBatch):
+            self.add_block(msg.accel, msg.timestamps)
+        else:
+            self.add(msg.accel_x, msg.accel_y, msg.accel_z, msg.timestamp)
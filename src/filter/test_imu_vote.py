@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from src.filter.filter_module import FilterModule, imu_fuse_bit
+from src.filter.imu_vote import ImuVoter
+
+
+def step(voter, accels, dt=0.02, mask=None):
+    for i, accel in enumerate(accels):
+        voter.deltas[i, :3] = np.multiply(accel, dt)
+        voter.deltas[i, 3:6] = 0.0
+        voter.deltas[i, 6] = dt
+    if mask is None:
+        mask = np.ones(len(accels), dtype=bool)
+    return voter.vote(mask)
+
+
+def test_faulty_imu_is_isolated_and_recovers():
+    voter = ImuVoter(3, fault_steps=5, recover_steps=10)
+    good = (0.0, 0.0, 9.81)
+    bad = (5.0, 0.0, 9.81)
+    for _ in range(5):
+        fused = step(voter, [good, good, bad])
+    assert voter.isolations == 1
+    assert voter.healthy.tolist() == [True, True, False]
+    assert fused[0] / fused[6] == pytest.approx(0.0, abs=1e-9)
+
+    for _ in range(10):
+        step(voter, [good, good, good])
+    assert voter.healthy.all()
+
+
+def test_units_that_did_not_report_are_left_out():
+    voter = ImuVoter(3)
+    fused = step(voter, [(1.0, 0.0, 0.0), (1.0, 0.0, 0.0), (50.0, 0.0, 0.0)],
+                 mask=np.array([True, True, False]))
+    assert fused[0] / fused[6] == pytest.approx(1.0)
+    assert voter.bad.tolist() == [0, 0, 0]
+
+
+def test_every_imu_has_its_own_fuse_bit():
+    bits = [imu_fuse_bit(i) for i in range(FilterModule.MAX_IMUS)]
+    assert bits[:3] == [4, 2, 8]
+    assert len(set(bits)) == len(bits)
+    assert not sum(bits) & 1 and sum(bits) < 1 << 16
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from src.filter.preintegration import ImuPreintegrator
+
+
+def test_block_matches_samples():
+    rng = np.random.default_rng(1)
+    times = 10.0 + np.cumsum(rng.uniform(0.004, 0.006, 40))
+    accel = rng.normal(0.0, 2.0, (40, 3))
+
+    single = ImuPreintegrator()
+    single.add(0.0, 0.0, 0.0, 10.0)
+    for (ax, ay, az), t in zip(accel.tolist(), times.tolist()):
+        single.add(ax, ay, az, t)
+
+    block = ImuPreintegrator()
+    block.add(0.0, 0.0, 0.0, 10.0)
+    block.add_block(accel[:15], times[:15])
+    block.add_block(accel[15:], times[15:])
+
+    for name in ("dv_x", "dv_y", "dv_z", "dp_x", "dp_y", "dp_z", "duration"):
+        assert getattr(block, name) == pytest.approx(getattr(single, name), abs=1e-12)
+    assert block.count == single.count == 40
+
+
+def test_constant_acceleration():
+    imu = ImuPreintegrator()
+    for i in range(101):
+        imu.add(2.0, 0.0, -1.0, i * 0.01)
+    assert imu.duration == pytest.approx(1.0)
+    assert (imu.dv_x, imu.dv_z) == pytest.approx((2.0, -1.0))
+    assert (imu.dp_x, imu.dp_z) == pytest.approx((1.0, -0.5))
@@ -1,34 +1,33 @@
 from src.params import param_server
-from src.core import bus, Message, get_time_sec
+from src.core import bus, get_time_sec
+from src.msgs import GpsPosition
 from src.lib.gps_driver import GPSDriver
 
 class GPSModule:
-    def __init__(self):
-        self.driver = GPSDriver()
-        self.last_pub_time = 0
+    def __init__(self, scenario=None):
+        self.driver = GPSDriver(scenario)
+
+    def rate(self):
+        # Scheduled at GPS_PUB_FREQ; 0 leaves the task idle
+        return param_server.get_param("GPS_PUB_FREQ")
     
     def step(self):
         avail_param = param_server.get_param("GPS_AVAIL")
         if not (avail_param & 1):
             return
 
-        freq = param_server.get_param("GPS_PUB_FREQ")
-        if freq == 0:
-            return
-            
-        period = 1.0 / freq
         now = get_time_sec()
+        data = self.driver.get_data(now)
+        if data is None:
+            # No fix, e.g. an outage in a scenario
+            return
         
-        if now - self.last_pub_time >= period:
-            data = self.driver.get_data()
-            
-            msg = Message(
-                lat=data['lat'],
-                lon=data['lon'],
-                alt=data['alt'],
-                satellites=data['satellites'],
-                uncertainty=data['uncertainty'],
-                timestamp=now
-            )
-            bus.publish("gps_position", msg)
-            self.last_pub_time = now
+        msg = GpsPosition(
+            data['lat'],
+            data['lon'],
+            data['alt'],
+            data['satellites'],
+            data['uncertainty'],
+            now
+        )
+        bus.publish("gps_position", msg)
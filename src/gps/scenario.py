@@ -0,0 +1,111 @@
+import math
+
+import numpy as np
+
+class GpsScenario:
+    """
+    Seeded GPS truth, drift and jamming episodes, generated on a `rate` Hz
+    grid for `duration` seconds and interpolated on lookup. Past the end the
+    vehicle carries on at its final velocity with no acceleration.
+    """
+    ORIGIN = (37.7749, -122.4194, 100.0)
+    METERS_TO_DEG = 1.0 / 111000.0
+    # Drift random walk, degrees per sqrt(second)
+    DRIFT_RATE = 0.00001 / math.sqrt(12.0)
+
+    # Columns of the grid table
+    LAT, LON, ACCEL_E, ACCEL_N, DRIFT_LAT, DRIFT_LON = range(6)
+
+    def __init__(self, duration=3600.0, seed=None, start=None, rate=10.0, speed=3.0, first_jam=5.0):
+        self.duration = duration
+        self.rate = rate
+        self.start = start
+        self.seed = seed
+        rng = np.random.default_rng(seed)
+
+        n = int(duration * rate) + 2
+        self.last = n - 1
+        t = np.arange(n) / rate
+        table = np.empty((n, 6))
+
+        # Trajectory: three sinusoids per axis with periods of 1-5 minutes,
+        # each contributing up to `speed` / 3 m/s, all starting at rest
+        omega = 2 * math.pi / rng.uniform(60.0, 300.0, size=(2, 3))
+        amp = speed / 3.0 / omega * rng.choice((-1.0, 1.0), size=(2, 3))
+        wave = np.cos(t[:, None, None] * omega)
+        pos = (amp * (1.0 - wave)).sum(axis=2)
+        accel = (amp * omega * omega * wave).sum(axis=2)
+        vel_e, vel_n = (amp * omega * np.sin(t[-1] * omega)).sum(axis=1).tolist()
+
+        lat0, lon0, _ = self.ORIGIN
+        # Final velocity in degrees per second
+        self.end_vel = (vel_n * self.METERS_TO_DEG, vel_e * self.METERS_TO_DEG / math.cos(math.radians(lat0)))
+        table[:, self.LAT] = lat0 + pos[:, 1] * self.METERS_TO_DEG
+        table[:, self.LON] = lon0 + pos[:, 0] * self.METERS_TO_DEG / math.cos(math.radians(lat0))
+        table[:, self.ACCEL_E] = accel[:, 0]
+        table[:, self.ACCEL_N] = accel[:, 1]
+
+        step = self.DRIFT_RATE / math.sqrt(rate)
+        drift = rng.normal(0.0, step, size=(n, 2))
+        drift[0] = 0.0
+        np.cumsum(drift, axis=0, out=table[:, self.DRIFT_LAT:])
+        self.table = table
+
+        # Episodes: clear then jammed, alternating, the first jam at first_jam
+        count = int(duration / 8.0) + 2
+        lengths = np.empty(2 * count)
+        lengths[0::2] = rng.uniform(5.0, 25.0, count)
+        lengths[1::2] = rng.uniform(3.0, 8.0, count)
+        lengths[0] = first_jam
+        self.boundaries = np.cumsum(lengths)
+        jammed = np.arange(2 * count) % 2 == 1
+        jump = np.where(jammed[:, None], (rng.random((2 * count, 2)) - 0.5) * 0.0005, 0.0)
+        sats = np.where(jammed, rng.integers(4, 10, 2 * count), rng.integers(16, 23, 2 * count))
+        sigma = np.where(jammed, rng.uniform(5.0, 15.0, 2 * count), rng.uniform(0.1, 0.5, 2 * count))
+        self.episodes = list(zip(jump[:, 0].tolist(), jump[:, 1].tolist(), sats.tolist(), sigma.tolist()))
+        self.segment = np.searchsorted(self.boundaries, t, side="right").tolist()
+
+    def locate(self, now):
+        """Grid index and fraction towards the next sample at time now, above 1 past the end."""
+        if self.start is None:
+            self.start = now
+        x = (now - self.start) * self.rate
+        if x <= 0.0:
+            return 0, 0.0
+        i = int(x)
+        if i >= self.last:
+            return self.last - 1, x - (self.last - 1)
+        return i, x - i
+
+    def row(self, now):
+        i, frac = self.locate(now)
+        a, b = self.table[i:i + 2].tolist()
+        if frac <= 1.0:
+            return [u + (v - u) * frac for u, v in zip(a, b)], i
+        over = (frac - 1.0) / self.rate
+        b[self.LAT] += self.end_vel[0] * over
+        b[self.LON] += self.end_vel[1] * over
+        b[self.ACCEL_E] = b[self.ACCEL_N] = 0.0
+        return b, i
+
+    def truth(self, now):
+        """True (lat, lon, alt) at time now."""
+        row, _ = self.row(now)
+        return row[self.LAT], row[self.LON], self.ORIGIN[2]
+
+    def accel(self, now):
+        """True (east, north, up) acceleration at time now, without gravity."""
+        row, _ = self.row(now)
+        return row[self.ACCEL_E], row[self.ACCEL_N], 0.0
+
+    def sample(self, now):
+        """GPS reading at time now, in the form GPSDriver.get_data returns."""
+        row, i = self.row(now)
+        jump_lat, jump_lon, sats, sigma = self.episodes[self.segment[i]]
+        return {
+            'lat': row[self.LAT] + row[self.DRIFT_LAT] + jump_lat,
+            'lon': row[self.LON] + row[self.DRIFT_LON] + jump_lon,
+            'alt': self.ORIGIN[2],
+            'satellites': sats,
+            'uncertainty': sigma
+        }
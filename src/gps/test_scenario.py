@@ -0,0 +1,20 @@
+import pytest
+
+from src.gps.scenario import GpsScenario
+
+
+def test_vehicle_keeps_its_final_velocity_past_the_end():
+    scenario = GpsScenario(60.0, seed=1, start=0.0)
+    assert scenario.accel(120.0) == (0.0, 0.0, 0.0)
+    lat1, lon1, _ = scenario.truth(100.0)
+    lat2, lon2, _ = scenario.truth(200.0)
+    lat3, lon3, _ = scenario.truth(300.0)
+    assert (lat2, lon2) != (lat1, lon1)
+    assert lat3 - lat2 == pytest.approx(lat2 - lat1)
+    assert lon3 - lon2 == pytest.approx(lon2 - lon1)
+
+
+def test_same_seed_same_run():
+    a = GpsScenario(30.0, seed=7, start=0.0)
+    b = GpsScenario(30.0, seed=7, start=0.0)
+    assert [a.sample(t) for t in (1.0, 12.5, 29.0)] == [b.sample(t) for t in (1.0, 12.5, 29.0)]
@@ -0,0 +1,37 @@
+import numpy as np
+
+class ImuBlockGenerator:
+    """
+    Generates IMU samples in NumPy blocks. generate() returns views that are
+    only valid until the next call.
+    """
+    def __init__(self, rate, sigma, seed=None, max_block=256):
+        self.rate = rate
+        self.period = 1.0 / rate
+        self.max_block = max_block
+        self.rng = np.random.default_rng(seed)
+        self.sigma = np.asarray(sigma, dtype=np.float64)
+        self.samples = np.empty((max_block, len(self.sigma)))
+        self.times = np.empty(max_block)
+        self.offsets = np.arange(max_block) * self.period
+        self.start = None
+        self.count = 0
+
+    def due(self, now):
+        """Number of samples whose timestamps are <= now and not yet generated."""
+        if self.start is None:
+            self.start = now
+        return int((now - self.start) * self.rate) + 1 - self.count
+
+    def generate(self, n, mean):
+        n = min(n, self.max_block)
+        samples = self.samples[:n]
+        times = self.times[:n]
+
+        self.rng.standard_normal(out=samples)
+        samples *= self.sigma
+        samples += mean
+
+        np.add(self.offsets[:n], self.start + self.count * self.period, out=times)
+        self.count += n
+        return samples, times
@@ -1,10 +1,19 @@
 import random
-import time
-from src.core import bus, Message, get_time_sec
+from src.core import bus, get_time_sec
+from src.msgs import ImuSample, ImuBatch
 
 class IMUModule:
-    def __init__(self, name, topic_name):
+    ACCEL_NOISE = 0.1
+    GYRO_NOISE = 0.01
+
+    def __init__(self, name, topic_name, rate=None, block=False, batch=False, seed=None, scenario=None):
+        """
+        block=True generates the samples due since the last step in one NumPy
+        block, batch=True publishes them as one ImuBatch. A scenario adds its
+        true acceleration.
+        """
         self.name = name
+        self.scenario = scenario
         self.topic_name = topic_name
         self.accel_x = 0.0
         self.accel_y = 0.0
@@ -12,15 +21,54 @@ class IMUModule:
         self.gyro_x = 0.0
         self.gyro_y = 0.0
         self.gyro_z = 0.0
+
+        self.batch = batch
+        self.block = None
+        if block:
+            if not rate:
+                raise ValueError("block mode needs a sample rate")
+            from src.imu.imu_block import ImuBlockGenerator
+            sigma = (self.ACCEL_NOISE,) * 3 + (self.GYRO_NOISE,) * 3
+            self.block = ImuBlockGenerator(rate, sigma, seed=seed)
         
     def step(self):
-        msg = Message(
-            accel_x = self.accel_x + random.gauss(0, 0.1),
-            accel_y = self.accel_y + random.gauss(0, 0.1),
-            accel_z = self.accel_z + random.gauss(0, 0.1),
-            gyro_x = self.gyro_x + random.gauss(0, 0.01),
-            gyro_y = self.gyro_y + random.gauss(0, 0.01),
-            gyro_z = self.gyro_z + random.gauss(0, 0.01),
-            timestamp = get_time_sec()
+        if self.block is not None:
+            self.step_block()
+            return
+
+        now = get_time_sec()
+        ax, ay, az = self.accel(now)
+        msg = ImuSample(
+            ax + random.gauss(0, self.ACCEL_NOISE),
+            ay + random.gauss(0, self.ACCEL_NOISE),
+            az + random.gauss(0, self.ACCEL_NOISE),
+            self.gyro_x + random.gauss(0, self.GYRO_NOISE),
+            self.gyro_y + random.gauss(0, self.GYRO_NOISE),
+            self.gyro_z + random.gauss(0, self.GYRO_NOISE),
+            now
         )
         bus.publish(self.topic_name, msg)
+
+    def step_block(self):
+        gen = self.block
+        now = get_time_sec()
+        mean = self.accel(now) + (self.gyro_x, self.gyro_y, self.gyro_z)
+        due = gen.due(now)
+
+        while due > 0:
+            samples, times = gen.generate(due, mean)
+            due -= len(times)
+
+            if self.batch:
+                msg = ImuBatch(samples[:, :3].copy(), samples[:, 3:].copy(), times.copy(), float(times[-1]))
+                bus.publish(self.topic_name, msg)
+            else:
+                topic = self.topic_name
+                for (ax, ay, az, gx, gy, gz), t in zip(samples.tolist(), times.tolist()):
+                    bus.publish(topic, ImuSample(ax, ay, az, gx, gy, gz, t))
+
+    def accel(self, now):
+        if self.scenario is None:
+            return self.accel_x, self.accel_y, self.accel_z
+        ax, ay, az = self.scenario.accel(now)
+        return self.accel_x + ax, self.accel_y + ay, self.accel_z + az
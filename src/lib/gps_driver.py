@@ -1,15 +1,17 @@
 import random
-import time
+from src.core import get_time_sec
 
 class GPSDriver:
-    def __init__(self):
+    def __init__(self, scenario=None):
+        """Readings come from scenario, when given, instead of `random`."""
+        self.scenario = scenario
         self.true_lat = 37.7749
         self.true_lon = -122.4194
         self.alt = 100.0
         
-        self.last_update = time.time()
+        self.last_update = get_time_sec()
         self.mode = 0
-        self.next_transition = time.time() + 5.0 
+        self.next_transition = get_time_sec() + 5.0 
         
         self.drift_lat = 0.0
         self.drift_lon = 0.0
@@ -19,8 +21,12 @@ class GPSDriver:
         self.sats = random.randint(16, 22)
         self.uncertainty = random.uniform(0.1, 0.5)
         
-    def get_data(self):
-        now = time.time()
+    def get_data(self, now=None):
+        if now is None:
+            now = get_time_sec()
+        if self.scenario is not None:
+            self.true_lat, self.true_lon, _ = self.scenario.truth(now)
+            return self.scenario.sample(now)
         
         self.drift_lat += (random.random() - 0.5) * 0.00001
         self.drift_lon += (random.random() - 0.5) * 0.00001
@@ -0,0 +1,62 @@
+from src.core import MessageType
+
+class ImuSample(MessageType):
+    __slots__ = ("accel_x", "accel_y", "accel_z", "gyro_x", "gyro_y", "gyro_z", "timestamp")
+    _format = "ddddddd"
+
+    def __init__(self, accel_x, accel_y, accel_z, gyro_x, gyro_y, gyro_z, timestamp):
+        self.accel_x = accel_x
+        self.accel_y = accel_y
+        self.accel_z = accel_z
+        self.gyro_x = gyro_x
+        self.gyro_y = gyro_y
+        self.gyro_z = gyro_z
+        self.timestamp = timestamp
+
+class GpsPosition(MessageType):
+    __slots__ = ("lat", "lon", "alt", "satellites", "uncertainty", "timestamp")
+    _format = "dddHdd"
+
+    def __init__(self, lat, lon, alt, satellites, uncertainty, timestamp):
+        self.lat = lat
+        self.lon = lon
+        self.alt = alt
+        self.satellites = satellites
+        self.uncertainty = uncertainty
+        self.timestamp = timestamp
+
+class VehicleGlobalPosition(MessageType):
+    __slots__ = ("lat", "lon", "alt", "accel_x", "accel_y", "accel_z", "dead_reckoning", "timestamp")
+    _format = "dddddd?d"
+
+    def __init__(self, lat, lon, alt, accel_x, accel_y, accel_z, dead_reckoning, timestamp):
+        self.lat = lat
+        self.lon = lon
+        self.alt = alt
+        self.accel_x = accel_x
+        self.accel_y = accel_y
+        self.accel_z = accel_z
+        self.dead_reckoning = dead_reckoning
+        self.timestamp = timestamp
+
+class ImuBatch(MessageType):
+    """
+    Block of IMU samples: accel and gyro are (n, 3) arrays, timestamps is
+    (n,) and timestamp is the time of the last sample.
+    """
+    __slots__ = ("accel", "gyro", "timestamps", "timestamp")
+
+    def __init__(self, accel, gyro, timestamps, timestamp):
+        self.accel = accel
+        self.gyro = gyro
+        self.timestamps = timestamps
+        self.timestamp = timestamp
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def mean(self):
+        """Collapse the block into a single ImuSample at the last timestamp."""
+        ax, ay, az = self.accel.mean(axis=0).tolist()
+        gx, gy, gz = self.gyro.mean(axis=0).tolist()
+        return ImuSample(ax, ay, az, gx, gy, gz, self.timestamp)
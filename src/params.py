@@ -6,8 +6,10 @@ class ParameterServer:
             cls._instance = super(ParameterServer, cls).__new__(cls)
             cls._instance.params = {
                 "FILTER_FUSE_SRC": 6,     
+                "FILTER_MODE": 0,
                 "GPS_PUB_FREQ": 1,        
                 "GPS_AVAIL": 1,           
+                "IMU_COUNT": 2,
                 "MIN_GPS_SAT_VAL": 0      
             }
         return cls._instance
@@ -0,0 +1,490 @@
+import math
+import select
+import shutil
+import sys
+import threading
+import time
+from collections import deque
+
+from src.core import bus, get_time_sec
+
+# Colors matching shell design
+CLEAR = "\033[2J"
+HOME = "\033[H"
+HIDE_CURSOR = "\033[?25l"
+SHOW_CURSOR = "\033[?25h"
+RESET = "\033[0m"
+BOLD = "\033[1m"
+DIM = "\033[2m"
+BORDER = "\033[38;5;197m"  # Coral/pink like shell
+CYAN = "\033[38;5;51m"
+GREEN = "\033[38;5;84m"
+YELLOW = "\033[38;5;227m"
+WHITE = "\033[38;5;255m"
+GRAY = "\033[38;5;245m"
+DARK_GRAY = "\033[38;5;238m"
+BG_DARK = "\033[48;5;233m"
+BG_ACCENT = "\033[48;5;236m"
+MAGENTA = "\033[38;5;207m"
+ORANGE = "\033[38;5;215m"
+BLUE = "\033[38;5;75m"
+
+SERIES_COLORS = (GREEN, YELLOW, CYAN, MAGENTA, ORANGE, BLUE)
+
+# Newest columns are redrawn every frame rather than scrolled into the grid,
+# so samples from a topic that lags slightly behind the others still land.
+LIVE_COLUMNS = 2
+# Smallest plot area drawn; below this only a warning is shown
+MIN_PLOT_HEIGHT = 4
+MIN_PLOT_WIDTH = 10
+
+
+def nice_number(x, round_down=False):
+    if x == 0:
+        return 1
+    exp = math.floor(math.log10(abs(x)))
+    frac = x / (10 ** exp)
+    if round_down:
+        if frac < 1.5:
+            nice_frac = 1
+        elif frac < 3:
+            nice_frac = 2
+        elif frac < 7:
+            nice_frac = 5
+        else:
+            nice_frac = 10
+    else:
+        if frac <= 1:
+            nice_frac = 1
+        elif frac <= 2:
+            nice_frac = 2
+        elif frac <= 5:
+            nice_frac = 5
+        else:
+            nice_frac = 10
+    return nice_frac * (10 ** exp)
+
+
+def compute_axis(data_min, data_max, n_ticks):
+    raw_range = data_max - data_min
+    if raw_range == 0:
+        raw_range = abs(data_min) * 0.1 if data_min != 0 else 1
+
+    raw_tick = raw_range / (n_ticks - 1)
+    tick_interval = nice_number(raw_tick)
+
+    axis_min = math.floor(data_min / tick_interval) * tick_interval
+    axis_max = math.ceil(data_max / tick_interval) * tick_interval
+
+    if axis_max == axis_min:
+        axis_max = axis_min + tick_interval
+
+    return axis_min, axis_max, tick_interval
+
+
+def format_tick(val, tick_interval):
+    if tick_interval >= 1:
+        return f"{val:12.0f}"
+    elif tick_interval >= 0.001:
+        decimals = max(0, min(8, -int(math.floor(math.log10(tick_interval))) + 1))
+        return f"{val:12.{decimals}f}"
+    else:
+        return f"{val:12.8f}"
+
+
+class SlidingWindow:
+    """Fixed-capacity ring buffer of floats with O(1) running min, max and mean."""
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.buffer = [0.0] * capacity
+        self.count = 0
+        self.total = 0.0
+        self.mins = deque()
+        self.maxs = deque()
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def push(self, value):
+        idx = self.count
+        slot = idx % self.capacity
+        if idx >= self.capacity:
+            self.total -= self.buffer[slot]
+            oldest = idx - self.capacity
+            if self.mins[0][0] == oldest:
+                self.mins.popleft()
+            if self.maxs[0][0] == oldest:
+                self.maxs.popleft()
+        self.buffer[slot] = value
+        self.total += value
+        self.count = idx + 1
+
+        mins = self.mins
+        while mins and mins[-1][1] >= value:
+            mins.pop()
+        mins.append((idx, value))
+        maxs = self.maxs
+        while maxs and maxs[-1][1] <= value:
+            maxs.pop()
+        maxs.append((idx, value))
+
+        if slot == self.capacity - 1:
+            self.total = math.fsum(self.buffer)
+
+    @property
+    def last(self):
+        return self.buffer[(self.count - 1) % self.capacity]
+
+    @property
+    def min(self):
+        return self.mins[0][1]
+
+    @property
+    def max(self):
+        return self.maxs[0][1]
+
+    @property
+    def mean(self):
+        return self.total / len(self)
+
+    def values(self):
+        """Values from oldest to newest."""
+        n = len(self)
+        start = self.count - n
+        return [self.buffer[i % self.capacity] for i in range(start, self.count)]
+
+
+class Column:
+    __slots__ = ("lo", "hi", "last", "prev")
+
+    def __init__(self, value, prev):
+        self.lo = value
+        self.hi = value
+        self.last = value
+        self.prev = prev
+
+    def add(self, value):
+        if value < self.lo:
+            self.lo = value
+        elif value > self.hi:
+            self.hi = value
+        self.last = value
+
+
+class Series:
+    """One TOPIC:FIELD line: recent samples and the time columns on screen."""
+    def __init__(self, topic, field, color, history):
+        self.topic = topic
+        self.field = field
+        self.name = f"{topic}.{field}"
+        self.color = color
+        self.point = f"{color}●{RESET}{BG_DARK}"
+        self.line = f"{DIM}{color}│{RESET}{BG_DARK}"
+        self.window = SlidingWindow(history)
+        self.times = [0.0] * history
+        self.columns = {}
+        self.order = deque()
+        self.axis = None
+
+    def push(self, t, value):
+        self.times[self.window.count % self.window.capacity] = t
+        self.window.push(value)
+
+    def samples(self):
+        window = self.window
+        start = window.count - len(window)
+        return [(self.times[i % window.capacity], window.buffer[i % window.capacity])
+                for i in range(start, window.count)]
+
+    def fold(self, idx, value, keep):
+        order = self.order
+        if order and idx <= order[-1]:
+            self.columns[order[-1]].add(value)
+            return
+        prev = self.columns[order[-1]].last if order else None
+        self.columns[idx] = Column(value, prev)
+        order.append(idx)
+        if len(order) > keep:
+            del self.columns[order.popleft()]
+
+    def clear(self):
+        self.columns.clear()
+        self.order.clear()
+
+
+class PlotEngine:
+    """
+    Character grid for one or more series on a shared time axis, each on
+    its own y axis.
+    """
+    def __init__(self, series, span):
+        self.series = series
+        self.span = span
+        self.lock = threading.Lock()
+        self.width = 0
+        self.height = 0
+        self.dt = span
+        self.head = None
+        self.drawn = None
+        self.rows = []
+
+    def push(self, series, t, value):
+        """Add one sample; the caller holds `lock`."""
+        series.push(t, value)
+        if self.width == 0:
+            return
+        idx = int(t // self.dt)
+        if self.head is not None and idx < self.head - self.width:
+            # Time went backwards (restart, replay); start the axis over
+            for s in self.series:
+                s.clear()
+            self.head = None
+            self.drawn = None
+        if self.head is None or idx > self.head:
+            self.head = idx
+        series.fold(idx, value, self.width)
+
+    def resize(self, width, height):
+        """Re-bucket every series for a new plot size; O(history)."""
+        self.width = width
+        self.height = height
+        self.dt = self.span / width
+        self.head = None
+        self.drawn = None
+        for s in self.series:
+            s.clear()
+            for t, value in s.samples():
+                idx = int(t // self.dt)
+                if self.head is None or idx > self.head:
+                    self.head = idx
+                s.fold(idx, value, width)
+
+    def row_of(self, axis, value):
+        y_min, y_max, _ = axis
+        y_range = y_max - y_min if y_max != y_min else 1
+        row = int((1 - (value - y_min) / y_range) * (self.height - 1))
+        return max(0, min(self.height - 1, row))
+
+    def _cells(self, idx):
+        cells = [" "] * self.height
+        points = []
+        for s in self.series:
+            col = s.columns.get(idx)
+            if col is None:
+                continue
+            top = self.row_of(s.axis, col.hi)
+            bottom = self.row_of(s.axis, col.lo)
+            if col.prev is not None:
+                prev_row = self.row_of(s.axis, col.prev)
+                top = min(top, prev_row)
+                bottom = max(bottom, prev_row)
+            for r in range(top, bottom + 1):
+                if cells[r] == " ":
+                    cells[r] = s.line
+            points.append((self.row_of(s.axis, col.last), s.point))
+        for r, point in points:
+            cells[r] = point
+        return cells
+
+    def grid(self, n_ticks):
+        """Return the plot rows for the current frame; the caller holds `lock`."""
+        rebuild = self.drawn is None or len(self.rows) != self.height
+        for s in self.series:
+            if len(s.window):
+                axis = compute_axis(s.window.min, s.window.max, n_ticks)
+                if axis != s.axis:
+                    s.axis = axis
+                    rebuild = True
+
+        done = self.head - LIVE_COLUMNS
+        n_cells = max(1, self.width - LIVE_COLUMNS)
+        if rebuild:
+            self.rows = [deque(" " * n_cells, maxlen=n_cells) for _ in range(self.height)]
+            self.drawn = done - n_cells
+        for idx in range(max(self.drawn + 1, done - n_cells + 1), done + 1):
+            for row, cell in zip(self.rows, self._cells(idx)):
+                row.append(cell)
+        self.drawn = done
+
+        tail = [self._cells(idx) for idx in range(done + 1, self.head + 1)]
+        return ["".join(row) + "".join(cells[r] for cells in tail)
+                for r, row in enumerate(self.rows)]
+
+
+def run_plotter(targets, history=500, span=10.0):
+    """Plot (topic, field) pairs until Ctrl+C."""
+    series = [Series(topic, field, SERIES_COLORS[i % len(SERIES_COLORS)], history)
+              for i, (topic, field) in enumerate(targets)]
+    engine = PlotEngine(series, span)
+    state = {"running": True}
+
+    def render():
+        size = shutil.get_terminal_size((80, 24))
+        width, height = size.columns, size.lines
+        content_width = width - 4
+
+        # Calculate plot dimensions
+        plot_height = height - 9 - len(series)  # Leave room for borders, title, time axis, stats
+        plot_width = content_width - 16  # Leave room for wider Y-axis labels (12 chars + padding)
+        num_ticks = max(2, min(6, plot_height // 3))
+
+        if plot_height < MIN_PLOT_HEIGHT or plot_width < MIN_PLOT_WIDTH:
+            sys.stdout.write(f"{CLEAR}{HOME}{YELLOW}Terminal too small for {len(series)} series"
+                             f" ({width}x{height}), Ctrl+C to return{RESET}")
+            sys.stdout.flush()
+            return
+
+        lines = []
+
+        # Top border
+        title = " " + ", ".join(s.name for s in series) + " "
+        if len(title) > width - 4:
+            title = f" {len(series)} series "
+        left_len = (width - 2 - len(title)) // 2
+        right_len = width - 2 - left_len - len(title)
+        top = f"{BORDER}┏{'━' * left_len}{RESET}{BG_ACCENT}{BOLD}{CYAN}{title}{RESET}{BORDER}{'━' * right_len}┓{RESET}"
+        lines.append(top)
+
+        # Subtitle
+        subtitle = " Ctrl+C to return "
+        sub_padding = content_width - len(subtitle)
+        left_pad = sub_padding // 2
+        right_pad = sub_padding - left_pad
+        sub_line = f"{BORDER}┃{RESET}{BG_DARK} {' ' * left_pad}{DIM}{GRAY}{subtitle}{RESET}{BG_DARK}{' ' * right_pad} {RESET}{BORDER}┃{RESET}"
+        lines.append(sub_line)
+
+        # Separator
+        sep = f"{BORDER}┃{RESET}{BG_DARK} {DARK_GRAY}{'─' * content_width}{RESET}{BG_DARK} {RESET}{BORDER}┃{RESET}"
+        lines.append(sep)
+
+        with engine.lock:
+            if (plot_width, plot_height) != (engine.width, engine.height):
+                engine.resize(plot_width, plot_height)
+
+            if engine.head is None:
+                # Waiting for data
+                for i in range(plot_height):
+                    if i == plot_height // 2:
+                        msg = "Waiting for data..."
+                        pad_left = (content_width - len(msg)) // 2
+                        pad_right = content_width - len(msg) - pad_left
+                        line = f"{BORDER}┃{RESET}{BG_DARK} {' ' * pad_left}{GRAY}{msg}{RESET}{BG_DARK}{' ' * pad_right} {RESET}{BORDER}┃{RESET}"
+                    else:
+                        line = f"{BORDER}┃{RESET}{BG_DARK} {' ' * content_width} {RESET}{BORDER}┃{RESET}"
+                    lines.append(line)
+            else:
+                rows = engine.grid(num_ticks)
+                # Y-axis labels follow the first series that has data
+                scale = next(s for s in series if s.axis is not None)
+                y_min, y_max, tick_interval = scale.axis
+                y_range = y_max - y_min if y_max != y_min else 1
+                label_color = GRAY if len(series) == 1 else scale.color
+
+                # Render plot rows
+                for row, row_str in enumerate(rows):
+                    y_val = y_max - (row / max(1, plot_height - 1)) * y_range
+                    remainder = abs(y_val - y_min) % tick_interval if tick_interval > 0 else 0
+                    is_tick = remainder < tick_interval * 0.1 or remainder > tick_interval * 0.9
+
+                    if is_tick:
+                        label = f"{label_color}{format_tick(y_val, tick_interval)} {GRAY}┤"
+                    else:
+                        label = "             │"
+
+                    padding = content_width - 14 - plot_width
+                    line = f"{BORDER}┃{RESET}{BG_DARK} {GRAY}{label}{RESET}{BG_DARK}{row_str}{' ' * max(0, padding)} {RESET}{BORDER}┃{RESET}"
+                    lines.append(line)
+
+            stats = [(s, len(s.window), s.window.last, s.window.min, s.window.max, s.window.mean)
+                     if len(s.window) else (s, 0) for s in series]
+
+        # Bottom axis
+        axis_line = f"             └{'─' * plot_width}"
+        axis_pad = content_width - 14 - plot_width
+        lines.append(f"{BORDER}┃{RESET}{BG_DARK} {GRAY}{axis_line}{RESET}{BG_DARK}{' ' * max(0, axis_pad)} {RESET}{BORDER}┃{RESET}")
+
+        # Time axis, by message timestamp
+        left, mid, right = f"-{span:g}s", f"-{span / 2:g}s", "now"
+        gap = plot_width - len(left) - len(mid) - len(right)
+        time_line = f"{left}{' ' * (gap // 2)}{mid}{' ' * (gap - gap // 2)}{right}"
+        time_pad = content_width - 14 - len(time_line)
+        lines.append(f"{BORDER}┃{RESET}{BG_DARK} {' ' * 14}{DIM}{GRAY}{time_line}{RESET}{BG_DARK}{' ' * max(0, time_pad)} {RESET}{BORDER}┃{RESET}")
+
+        # Stats separator
+        lines.append(f"{BORDER}┃{RESET}{BG_DARK} {DARK_GRAY}{'─' * content_width}{RESET}{BG_DARK} {RESET}{BORDER}┃{RESET}")
+
+        # Stats, one line per series
+        for stat in stats:
+            s = stat[0]
+            if stat[1] == 0:
+                text = f"  ● {s.name}  waiting for data"
+                colored = f"  {s.color}● {s.name}{RESET}{BG_DARK}  {GRAY}waiting for data{RESET}{BG_DARK}"
+            else:
+                _, n_samples, current, min_v, max_v, avg_v = stat
+                values = (("now", current), ("min", min_v), ("max", max_v), ("avg", avg_v))
+                text = f"  ● {s.name}" + "".join(f"  {k} {v:.7g}" for k, v in values) + f"  n {n_samples}"
+                colored = (f"  {s.color}● {BOLD}{s.name}{RESET}{BG_DARK}"
+                           + "".join(f"  {GRAY}{k}{RESET}{BG_DARK} {WHITE}{v:.7g}{RESET}{BG_DARK}" for k, v in values)
+                           + f"  {GRAY}n{RESET}{BG_DARK} {WHITE}{n_samples}{RESET}{BG_DARK}")
+            if len(text) > content_width:
+                text = text[:content_width]
+                colored = f"{s.color}{text}{RESET}{BG_DARK}"
+            lines.append(f"{BORDER}┃{RESET}{BG_DARK} {colored}{' ' * (content_width - len(text))} {RESET}{BORDER}┃{RESET}")
+
+        # Bottom border
+        lines.append(f"{BORDER}┗{'━' * (width - 2)}┛{RESET}")
+
+        output = CLEAR + HOME + "\n".join(lines)
+        sys.stdout.write(output)
+        sys.stdout.flush()
+
+    def make_callback(topic_series):
+        # One subscription per topic feeds every series plotted from it
+        def callback(msg):
+            if not state["running"]:
+                return
+
+            t = getattr(msg, "timestamp", None)
+            if not isinstance(t, (int, float)):
+                t = get_time_sec()
+
+            with engine.lock:
+                for s in topic_series:
+                    val = getattr(msg, s.field, None)
+                    if val is None or isinstance(val, bool) or not isinstance(val, (int, float)):
+                        continue
+                    engine.push(s, t, val)
+        return callback
+
+    by_topic = {}
+    for s in series:
+        by_topic.setdefault(s.topic, []).append(s)
+
+    sys.stdout.write(HIDE_CURSOR)
+    sys.stdout.flush()
+
+    subs = [bus.subscribe(topic, make_callback(topic_series), queue_size=1000)
+            for topic, topic_series in by_topic.items()]
+
+    # Main loop - check for Ctrl+C and periodically render
+    last_render_time = time.time()
+    try:
+        render()
+        while state["running"]:
+            if select.select([sys.stdin], [], [], 0.05)[0]:
+                ch = sys.stdin.read(1)
+                if ch == "\x03":
+                    break
+
+            now = time.time()
+            if now - last_render_time >= 0.1:
+                render()
+                last_render_time = now
+    finally:
+        state["running"] = False
+        for sub in subs:
+            sub.unsubscribe()
+        while select.select([sys.stdin], [], [], 0)[0]:
+            sys.stdin.read(1)
+        sys.stdout.write(SHOW_CURSOR)
+        sys.stdout.flush()
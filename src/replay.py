@@ -0,0 +1,150 @@
+"""
+Deterministic replay of a bag through FilterModule under a virtual clock,
+on a fixed --rate grid or, with --recorded-steps, at the recorded output
+times (which must be filter ticks at --rate).
+
+    python3 -m src.replay BAG [-o OUT] [--rate HZ] [--recorded-steps] [--param NAME=VALUE ...]
+"""
+import argparse
+import hashlib
+import itertools
+import sys
+import time
+
+from src.core import bus, set_clock, VirtualClock
+from src.params import param_server
+from src.bag import BagReader, BagWriter, RECORD, STAMP, KIND_MESSAGE
+from src.codec import schema_for
+from src.filter.filter_module import FilterModule
+
+GPS_TOPIC = "gps_position"
+OUTPUT_TOPIC = "vehicle_global_position"
+
+class Replay:
+    # Allowed spread of recorded step intervals around the filter period
+    TICK_TOLERANCE = 0.5
+
+    def __init__(self, path, topics=None, rate=50.0, recorded_steps=False):
+        """topics defaults to gps_position and the IMU topics of IMU_COUNT."""
+        self.path = path
+        self.topics = None if topics is None else set(topics)
+        self.period = 1.0 / rate
+        self.recorded_steps = recorded_steps
+        self.clock = VirtualClock()
+        self.filter = None
+        self.start_time = None
+        self.inputs = 0
+        self.steps = 0
+        self.digest = hashlib.sha256()
+        self.writer = None
+        self.schema = None
+
+    def _on_output(self, msg):
+        if self.schema is None:
+            self.schema = schema_for(msg)
+            if self.writer is not None:
+                self.writer.write_topic(0, OUTPUT_TOPIC, self.schema)
+        data = self.schema.pack(msg)
+        self.digest.update(data)
+        if self.writer is not None:
+            self.writer.write(RECORD.pack(KIND_MESSAGE, 0, STAMP.size + len(data)) + STAMP.pack(msg.timestamp) + data)
+
+    def _step(self, t):
+        self.clock.set(t)
+        self.filter.step()
+        self.steps += 1
+
+    def check_recorded_steps(self):
+        """Raise ValueError unless the recorded outputs are filter ticks at the replay rate."""
+        low = self.period * (1.0 - self.TICK_TOLERANCE)
+        high = self.period * (1.0 + self.TICK_TOLERANCE)
+        last = None
+        count = 0
+        for topic, _, msg in BagReader(self.path):
+            if topic != OUTPUT_TOPIC:
+                continue
+            if last is not None and not low <= msg.timestamp - last <= high:
+                raise ValueError(f"{self.path}: {OUTPUT_TOPIC} at {msg.timestamp:.3f} is "
+                                 f"{msg.timestamp - last:.3f} s after the previous one, "
+                                 f"not a filter tick at {1.0 / self.period:g} Hz")
+            last = msg.timestamp
+            count += 1
+        if count < 2:
+            raise ValueError(f"{self.path}: no recorded {OUTPUT_TOPIC} steps")
+
+    def run(self, output=None):
+        if self.recorded_steps:
+            self.check_recorded_steps()
+        if output is not None:
+            self.writer = BagWriter(output)
+        previous = set_clock(self.clock)
+        sub = bus.subscribe(OUTPUT_TOPIC, self._on_output)
+        try:
+            records = iter(BagReader(self.path))
+            first = next(records, None)
+            if first is None:
+                return self
+            self.start_time = first[1]
+            self.clock.set(first[1])
+            self.filter = FilterModule()
+            if self.topics is None:
+                self.topics = {GPS_TOPIC, *self.filter.imu_topics}
+
+            next_step = first[1] + self.period
+            for topic, stamp, msg in itertools.chain([first], records):
+                if topic == OUTPUT_TOPIC and self.recorded_steps:
+                    self._step(msg.timestamp)
+                    continue
+                if topic not in self.topics:
+                    continue
+                if not self.recorded_steps:
+                    while next_step <= stamp:
+                        self._step(next_step)
+                        next_step += self.period
+                self.clock.set(stamp)
+                bus.publish(topic, msg)
+                self.inputs += 1
+        finally:
+            sub.unsubscribe()
+            set_clock(previous)
+            if self.writer is not None:
+                self.writer.close()
+        return self
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a bag through FilterModule")
+    parser.add_argument("bag")
+    parser.add_argument("-o", "--output", help="write vehicle_global_position to this bag")
+    parser.add_argument("--rate", type=float, default=50.0, help="filter rate in Hz (FILTER_RATE of the simulation)")
+    parser.add_argument("--recorded-steps", action="store_true",
+                        help="step at the recorded vehicle_global_position times instead of a fixed grid")
+    parser.add_argument("--param", action="append", default=[], metavar="NAME=VALUE")
+    args = parser.parse_args()
+
+    for item in args.param:
+        name, _, value = item.partition("=")
+        if param_server.get_param(name) is None or not value:
+            print(f"Bad parameter override: {item}")
+            return 1
+        param_server.set_param(name, int(value))
+
+    start = time.perf_counter()
+    try:
+        replay = Replay(args.bag, rate=args.rate, recorded_steps=args.recorded_steps).run(args.output)
+    except ValueError as e:
+        print(e)
+        return 1
+    elapsed = time.perf_counter() - start
+
+    if replay.filter is None:
+        print(f"{args.bag}: no messages")
+        return 1
+
+    span = replay.clock.now() - replay.start_time
+    print(f"Replayed {span:.1f} s of data ({replay.inputs} messages, {replay.steps} filter steps) "
+          f"in {elapsed:.2f} s, {span / max(elapsed, 1e-9):.0f}x real time")
+    print(f"Digest: {replay.digest.hexdigest()}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
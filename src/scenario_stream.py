@@ -0,0 +1,240 @@
+"""
+Scenario files for long GPS/IMU runs.
+
+A scenario is a text file (optionally gzip-compressed, by a .gz suffix)
+with one event per line, sorted by time. Times are seconds from the start
+of the run, distances are metres, `#` starts a comment:
+
+    # time  event    arguments
+    0       nominal  sats=18 sigma=0.3
+    0       accel    0.5 0.0            # east, north m/s^2 until the next accel
+    20      accel    0 0
+    60      jam      30 sats=6 sigma=12 jump=25,-10
+    120     outage   15
+    200     dip      20 sats=8
+    300     gps      sats=3 east=40     # overrides the next GPS sample only
+    3600    end
+
+jam, outage and dip take a duration and may overlap: a jam offsets the fix
+by jump (east, north), an outage removes it and a dip only lowers the
+satellite count. The vehicle starts at rest at the origin.
+
+The file is checked when opened and then streamed, never loaded whole.
+"""
+import gzip
+import math
+import random
+
+ORIGIN = (37.7749, -122.4194, 100.0)
+METERS_TO_DEG = 1.0 / 111000.0
+
+# Events taking a duration, and the keyword arguments each event accepts
+WINDOWS = ("jam", "outage", "dip")
+KEYWORDS = {
+    "nominal": ("sats", "sigma"),
+    "jam": ("sats", "sigma", "jump"),
+    "outage": (),
+    "dip": ("sats",),
+    "gps": ("sats", "sigma", "east", "north"),
+    "accel": (),
+    "end": (),
+}
+
+class ScenarioError(ValueError):
+    pass
+
+def read_lines(path):
+    """Yield (line number, fields) for each non-empty line, comments removed."""
+    opener = gzip.open if str(path).endswith(".gz") else open
+    with opener(path, "rt") as f:
+        for lineno, line in enumerate(f, 1):
+            fields = line.split("#", 1)[0].split()
+            if fields:
+                yield lineno, fields
+
+def parse_events(lines, path="<scenario>"):
+    """Yield (time, event, positional args, keyword args), checking order."""
+    last = 0.0
+    for lineno, fields in lines:
+        where = f"{path}:{lineno}"
+        if len(fields) < 2 or fields[1] not in KEYWORDS:
+            raise ScenarioError(f"{where}: expected TIME EVENT [ARGS], got {' '.join(fields)!r}")
+        event = fields[1]
+        try:
+            t = float(fields[0])
+            args = []
+            kwargs = {}
+            for item in fields[2:]:
+                name, sep, value = item.partition("=")
+                if not sep:
+                    args.append(float(item))
+                elif name not in KEYWORDS[event]:
+                    raise ScenarioError(f"{where}: {event} does not take {name}")
+                elif name == "jump":
+                    kwargs[name] = tuple(float(v) for v in value.split(","))
+                else:
+                    kwargs[name] = float(value)
+        except ValueError as e:
+            if isinstance(e, ScenarioError):
+                raise
+            raise ScenarioError(f"{where}: {e}") from None
+        if t < last:
+            raise ScenarioError(f"{where}: time {t} is before the previous event at {last}")
+        if event in WINDOWS and len(args) != 1:
+            raise ScenarioError(f"{where}: {event} needs a duration")
+        if event == "accel" and len(args) != 2:
+            raise ScenarioError(f"{where}: accel needs east and north")
+        if "jump" in kwargs and len(kwargs["jump"]) != 2:
+            raise ScenarioError(f"{where}: jump needs east,north")
+        last = t
+        yield t, event, args, kwargs
+        if event == "end":
+            return
+
+def select(events, kinds):
+    for event in events:
+        if event[1] in kinds:
+            yield event
+
+class Motion:
+    """Position and velocity under the scenario's piecewise-constant acceleration."""
+    def __init__(self):
+        self.time = 0.0
+        self.east = self.north = 0.0
+        self.vel_e = self.vel_n = 0.0
+        self.acc_e = self.acc_n = 0.0
+
+    def advance(self, t):
+        dt = t - self.time
+        if dt <= 0:
+            return
+        half = 0.5 * dt * dt
+        self.east += self.vel_e * dt + self.acc_e * half
+        self.north += self.vel_n * dt + self.acc_n * half
+        self.vel_e += self.acc_e * dt
+        self.vel_n += self.acc_n * dt
+        self.time = t
+
+class Cursor:
+    """Walks one event generator forward, applying events up to a time."""
+    def __init__(self, events, apply):
+        self.events = events
+        self.apply = apply
+        self.pending = next(events, None)
+
+    def advance(self, t):
+        while self.pending is not None and self.pending[0] <= t:
+            self.apply(*self.pending)
+            self.pending = next(self.events, None)
+
+class ScenarioStream:
+    """
+    Plays a scenario file to GPSDriver and IMUModule. With a seed, fixes get
+    Gaussian noise of the uncertainty they report.
+    """
+    def __init__(self, path, start=None, seed=None):
+        self.path = path
+        self.start = start
+        self.rng = random.Random(seed) if seed is not None else None
+        self.lon_scale = math.cos(math.radians(ORIGIN[0]))
+
+        # Raise ScenarioError now rather than when the clock reaches a bad line
+        for _ in self.events():
+            pass
+
+        self.motion = Motion()
+        self.sats = 18
+        self.sigma = 0.3
+        self.windows = []
+        self.override = {}
+        self.gps = Cursor(self.events(), self._apply_gps)
+
+        self.imu_accel = (0.0, 0.0)
+        self.imu = Cursor(select(self.events(), ("accel",)), self._apply_imu)
+
+    def events(self):
+        return parse_events(read_lines(self.path), self.path)
+
+    def elapsed(self, now):
+        if self.start is None:
+            self.start = now
+        return now - self.start
+
+    def _apply_gps(self, t, event, args, kwargs):
+        if event == "accel":
+            motion = self.motion
+            motion.advance(t)
+            motion.acc_e, motion.acc_n = args
+        elif event == "nominal":
+            self.sats = int(kwargs.get("sats", self.sats))
+            self.sigma = kwargs.get("sigma", self.sigma)
+        elif event in WINDOWS:
+            self.windows.append((t + args[0], event, kwargs))
+        elif event == "gps":
+            self.override.update(kwargs)
+
+    def _apply_imu(self, t, event, args, kwargs):
+        self.imu_accel = tuple(args)
+
+    def position(self, t):
+        self.gps.advance(t)
+        self.motion.advance(t)
+        return self.motion.east, self.motion.north
+
+    def to_global(self, east, north):
+        lat0, lon0, _ = ORIGIN
+        return lat0 + north * METERS_TO_DEG, lon0 + east * METERS_TO_DEG / self.lon_scale
+
+    def truth(self, now):
+        """True (lat, lon, alt) at time now."""
+        lat, lon = self.to_global(*self.position(self.elapsed(now)))
+        return lat, lon, ORIGIN[2]
+
+    def accel(self, now):
+        """True (east, north, up) acceleration at time now, without gravity."""
+        self.imu.advance(self.elapsed(now))
+        return self.imu_accel + (0.0,)
+
+    def sample(self, now):
+        """GPS reading at time now like GPSDriver.get_data, or None in an outage."""
+        t = self.elapsed(now)
+        east, north = self.position(t)
+        if self.windows:
+            self.windows = [w for w in self.windows if w[0] > t]
+
+        sats = self.sats
+        sigma = self.sigma
+        outage = False
+        for _, event, kwargs in self.windows:
+            if event == "outage":
+                outage = True
+            elif event == "dip":
+                sats = min(sats, int(kwargs.get("sats", sats)))
+            else:
+                sats = int(kwargs.get("sats", sats))
+                sigma = kwargs.get("sigma", sigma)
+                jump_e, jump_n = kwargs.get("jump", (0.0, 0.0))
+                east += jump_e
+                north += jump_n
+
+        override = self.override
+        if override:
+            self.override = {}
+            sats = int(override.get("sats", sats))
+            sigma = override.get("sigma", sigma)
+            east += override.get("east", 0.0)
+            north += override.get("north", 0.0)
+        if outage:
+            return None
+
+        if self.rng is not None:
+            east += self.rng.gauss(0.0, sigma)
+            north += self.rng.gauss(0.0, sigma)
+        lat, lon = self.to_global(east, north)
+        return {
+            'lat': lat,
+            'lon': lon,
+            'alt': ORIGIN[2],
+            'satellites': sats,
+            'uncertainty': sigma
+        }
@@ -0,0 +1,178 @@
+import heapq
+import math
+import time
+
+from src.core import bus, get_time_sec, sleep, Message
+from src.stats import Histogram, RunningStats, BucketCounter
+
+# Starts up to this far past their deadline are normal wake-up jitter
+LATENESS_TOLERANCE = 0.001
+# Upper edges (seconds) of the deadline-miss lateness buckets
+LATENESS_EDGES = (0.005, 0.020)
+LATENESS_LABELS = ("late_1_5ms", "late_5_20ms", "late_gt_20ms")
+
+class Task:
+    """
+    Periodic step function. rate is in Hz or a callable re-read every period;
+    0 or None idles the task. After a missed deadline, policy "skip" drops
+    the missed ticks and "catchup" runs up to max_catchup of them.
+    """
+    IDLE_POLL = 0.1
+    POLICIES = ("skip", "catchup")
+
+    def __init__(self, name, step, rate, policy="skip", max_catchup=5, order=0):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown miss policy: {policy}")
+        self.name = name
+        self.step = step
+        self.rate = rate
+        self.policy = policy
+        self.max_catchup = max_catchup
+        self.order = order
+
+        self.period = None
+        self.anchor = 0.0
+        self.ticks = 0
+        self.deadline = 0.0
+        self.backlog = 0
+
+        self.runs = 0
+        self.missed = 0
+        self.skipped = 0
+        self.overruns = 0
+
+        # Timing since the last stats report
+        self.cost = Histogram()
+        self.interval = RunningStats()
+        self.last_start = None
+
+    def record(self, start, cost):
+        self.runs += 1
+        self.cost.add(cost)
+        if self.period is not None:
+            if cost > self.period:
+                self.overruns += 1
+            if self.last_start is not None:
+                # Deviation of the start-to-start interval from the period
+                self.interval.add(start - self.last_start - self.period)
+        self.last_start = start
+
+    def current_rate(self):
+        return self.rate() if callable(self.rate) else self.rate
+
+    def start(self, now):
+        self.anchor = now
+        self.ticks = 0
+        self.deadline = now
+        self.period = None
+
+    def reschedule(self, now):
+        rate = self.current_rate()
+        period = 1.0 / rate if rate else None
+
+        if period != self.period:
+            # Rate changed (or task went idle): re-anchor on the tick just run
+            self.anchor = self.deadline
+            self.ticks = 0
+            self.period = period
+            self.backlog = 0
+
+        if period is None:
+            self.anchor = now + self.IDLE_POLL
+            self.deadline = self.anchor
+            return
+
+        self.ticks += 1
+        deadline = self.anchor + self.ticks * period
+        if deadline > now:
+            self.backlog = 0
+            self.deadline = deadline
+            return
+
+        self.missed += 1
+        if self.policy == "catchup" and self.backlog < self.max_catchup:
+            self.backlog += 1
+            self.deadline = deadline
+            return
+
+        # Jump to the first tick after now
+        ticks = math.floor((now - self.anchor) / period) + 1
+        self.skipped += ticks - self.ticks
+        self.ticks = ticks
+        self.backlog = 0
+        self.deadline = self.anchor + ticks * period
+
+class Scheduler:
+    """Runs tasks at their own rates against absolute deadlines on the core clock."""
+    def __init__(self):
+        self.tasks = []
+        self.heap = []
+        self.started = False
+        self.lateness = BucketCounter(LATENESS_EDGES)
+
+    def add(self, name, step, rate, policy="skip", max_catchup=5):
+        task = Task(name, step, rate, policy, max_catchup, order=len(self.tasks))
+        self.tasks.append(task)
+        if self.started:
+            task.start(get_time_sec())
+            heapq.heappush(self.heap, (task.deadline, task.order, task))
+        return task
+
+    def start(self):
+        now = get_time_sec()
+        self.heap = []
+        for task in self.tasks:
+            task.start(now)
+            self.heap.append((task.deadline, task.order, task))
+        heapq.heapify(self.heap)
+        self.started = True
+
+    def run_once(self):
+        """Run the next due task, sleeping until its deadline if needed; idle tasks only reschedule."""
+        deadline, _, task = self.heap[0]
+        now = get_time_sec()
+        if deadline > now:
+            sleep(deadline - now)
+
+        heapq.heappop(self.heap)
+        if task.current_rate():
+            start = get_time_sec()
+            if start - deadline > LATENESS_TOLERANCE:
+                self.lateness.add(start - deadline)
+
+            t0 = time.perf_counter()
+            task.step()
+            task.record(start, time.perf_counter() - t0)
+        task.reschedule(get_time_sec())
+        heapq.heappush(self.heap, (task.deadline, task.order, task))
+        return task
+
+    def run(self, should_run=None, duration=None):
+        if not self.started:
+            self.start()
+        end = get_time_sec() + duration if duration is not None else None
+        while self.heap:
+            if should_run is not None and not should_run():
+                break
+            if end is not None and self.heap[0][0] > end:
+                break
+            self.run_once()
+
+    def publish_stats(self, topic="scheduler_stats"):
+        """Publish per-task timing on scheduler_stats and start a new window."""
+        fields = {}
+        for task in self.tasks:
+            name = task.name
+            fields[f"{name}_p50_ms"] = task.cost.percentile(50) * 1e3
+            fields[f"{name}_p90_ms"] = task.cost.percentile(90) * 1e3
+            fields[f"{name}_p99_ms"] = task.cost.percentile(99) * 1e3
+            fields[f"{name}_max_ms"] = task.cost.max * 1e3
+            fields[f"{name}_jitter_ms"] = task.interval.std * 1e3
+            fields[f"{name}_overruns"] = task.overruns
+            fields[f"{name}_missed"] = task.missed
+            task.cost.reset()
+            task.interval.reset()
+        for label, count in zip(LATENESS_LABELS, self.lateness.counts):
+            fields[label] = count
+        fields["timestamp"] = get_time_sec()
+        bus.publish(topic, Message(**fields))
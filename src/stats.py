@@ -0,0 +1,123 @@
+import math
+from collections import deque
+
+class Histogram:
+    """
+    Constant-memory histogram with log-spaced buckets between lo and hi.
+    Values outside the range are clamped into the end buckets.
+    """
+    def __init__(self, lo=1e-6, hi=10.0, buckets_per_decade=20):
+        self.lo = lo
+        self.scale = buckets_per_decade
+        self.n_buckets = int(math.ceil(math.log10(hi / lo) * buckets_per_decade)) + 1
+        self.buckets = [0] * self.n_buckets
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        if value > self.lo:
+            idx = int(math.log10(value / self.lo) * self.scale)
+            if idx >= self.n_buckets:
+                idx = self.n_buckets - 1
+        else:
+            idx = 0
+        self.buckets[idx] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, p):
+        if self.count == 0:
+            return 0.0
+        rank = p / 100.0 * self.count
+        seen = 0
+        for idx, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank and n:
+                # Geometric middle of the bucket, never above the true max
+                value = self.lo * 10 ** ((idx + 0.5) / self.scale)
+                return min(value, self.max)
+        return self.max
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def reset(self):
+        self.buckets = [0] * self.n_buckets
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+class RunningStats:
+    """Streaming count, mean, standard deviation, min and max (Welford)."""
+    def __init__(self):
+        self.reset()
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    @property
+    def std(self):
+        return math.sqrt(self.m2 / self.count) if self.count > 1 else 0.0
+
+    def reset(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+class BucketCounter:
+    """Counts values into fixed buckets given by their upper edges."""
+    def __init__(self, edges):
+        self.edges = list(edges)
+        self.counts = [0] * (len(self.edges) + 1)
+
+    def add(self, value):
+        for idx, edge in enumerate(self.edges):
+            if value <= edge:
+                self.counts[idx] += 1
+                return
+        self.counts[-1] += 1
+
+class RateWindow:
+    """Message rate over a sliding window of timestamps, like rostopic hz."""
+    def __init__(self, window=1000):
+        self.times = deque(maxlen=window)
+        self.new = 0
+
+    def add(self, t):
+        times = self.times
+        if times and t < times[-1]:
+            times.clear()
+        times.append(t)
+        self.new += 1
+
+    def summary(self):
+        """
+        Return (rate, min, max, std, n_periods), or None if no message
+        arrived since the previous call or fewer than two are buffered.
+        """
+        if not self.new:
+            return None
+        self.new = 0
+        times = list(self.times)
+        if len(times) < 2:
+            return None
+        periods = [b - a for a, b in zip(times, times[1:])]
+        n = len(periods)
+        mean = (times[-1] - times[0]) / n
+        if mean <= 0:
+            return None
+        std = math.sqrt(sum((p - mean) ** 2 for p in periods) / n)
+        return 1.0 / mean, min(periods), max(periods), std, n
@@ -0,0 +1,62 @@
+import time
+
+import numpy as np
+
+from src.bag import Recorder, BagReader, summarize, record_size
+from src.core import bus
+from src.msgs import ImuSample, ImuBatch, GpsPosition
+
+
+def wait_for(predicate, timeout=2.0):
+    end = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < end:
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_record_and_read_back(tmp_path):
+    path = str(tmp_path / "test.bag")
+    recorder = Recorder(path, ["test_bag_imu", "test_bag_gps"])
+    imu = [ImuSample(i, 2.0, 9.81, 0.0, 0.0, 0.1, 100.0 + i) for i in range(50)]
+    gps = GpsPosition(37.7, -122.4, 100.0, 18, 0.3, 101.0)
+    for msg in imu:
+        bus.publish("test_bag_imu", msg)
+    bus.publish("test_bag_gps", gps)
+    assert recorder.stop() == 51
+
+    records = list(BagReader(path))
+    assert [m.accel_x for t, _, m in records if t == "test_bag_imu"] == [float(i) for i in range(50)]
+    (gps_back,) = [m for t, _, m in records if t == "test_bag_gps"]
+    assert (gps_back.lat, gps_back.satellites, gps_back.timestamp) == (37.7, 18, 101.0)
+    assert summarize(path)["test_bag_imu"][0] == 50
+
+
+def test_unrecordable_topic_is_reported(tmp_path):
+    recorder = Recorder(str(tmp_path / "batch.bag"), ["test_bag_batch"])
+    batch = ImuBatch(np.zeros((4, 3)), np.zeros((4, 3)), np.arange(4.0), 3.0)
+    bus.publish("test_bag_batch", batch)
+    assert recorder.stop() == 0
+    assert recorder.skipped == 1
+    assert recorder.unrecordable == {"test_bag_batch"}
+
+
+def test_write_error_stops_recording(tmp_path):
+    recorder = Recorder(str(tmp_path / "fail.bag"), ["test_bag_fail"])
+
+    def fail(data):
+        raise OSError("disk full")
+
+    recorder.writer.write = fail
+    bus.publish("test_bag_fail", ImuSample(0.0, 0.0, 9.81, 0.0, 0.0, 0.0, 1.0))
+    assert wait_for(lambda: recorder.error is not None)
+    assert not any(sub.active for sub in recorder.subs)
+    bus.publish("test_bag_fail", ImuSample(0.0, 0.0, 9.81, 0.0, 0.0, 0.0, 2.0))
+    assert not recorder.queue
+    recorder.stop()
+    assert "disk full" in str(recorder.error)
+
+
+def test_record_size_encodes_the_message():
+    gps = GpsPosition(37.7, -122.4, 100.0, 18, 0.3, 101.0)
+    assert record_size(gps) == 5 + 8 + 8 * 5 + 2
+    assert record_size(GpsPosition(37.7, -122.4, 100.0, -1, 0.3, 101.0)) is None
@@ -0,0 +1,12 @@
+from src.cli import HeadlessShell
+from src.params import param_server
+
+
+def test_unknown_parameter_fails_the_script(capsys):
+    shell = HeadlessShell()
+    shell.process_command("param set MIN_GPS_SATS 12")
+    out = capsys.readouterr().out
+    assert shell.errors == 1
+    assert "Unknown parameter: MIN_GPS_SATS" in out
+    assert "set to" not in out
+    assert param_server.get_param("MIN_GPS_SATS") is None
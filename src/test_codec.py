@@ -0,0 +1,26 @@
+from src.codec import schema_for
+from src.core import Message
+from src.msgs import VehicleGlobalPosition
+
+
+def test_declared_message_round_trip():
+    msg = VehicleGlobalPosition(37.7749, -122.4194, 100.0, 0.1, -0.2, 9.81, True, 1234.5)
+    schema = schema_for(msg)
+    assert schema is schema_for(msg)
+    back = schema.unpack(schema.pack(msg))
+    assert type(back) is VehicleGlobalPosition
+    assert [getattr(back, f) for f in schema.fields] == [getattr(msg, f) for f in schema.fields]
+
+
+def test_free_form_message_round_trip():
+    msg = Message(count=3, ratio=0.25, ok=False)
+    schema = schema_for(msg)
+    assert schema.format == "qd?"
+    buffer = bytearray(2 + schema.size)
+    schema.pack_into(buffer, 2, msg)
+    back = schema.unpack(bytes(buffer), 2)
+    assert dict(back.items()) == {"count": 3, "ratio": 0.25, "ok": False}
+
+
+def test_unpackable_fields_have_no_schema():
+    assert schema_for(Message(name="gps", value=1.0)) is None
@@ -0,0 +1,143 @@
+import gc
+import threading
+import time
+
+import pytest
+
+from src.core import Bus, ScaledClock
+
+
+def publish_for(bus, topic, seconds):
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        bus.publish(topic, 1)
+
+
+def test_max_rate_ignores_callback_return_value():
+    bus = Bus()
+    calls = []
+
+    def callback(msg):
+        calls.append(msg)
+        return False
+
+    sub = bus.subscribe("test_rate_false", callback, max_rate=10)
+    try:
+        publish_for(bus, "test_rate_false", 0.3)
+    finally:
+        sub.unsubscribe()
+    assert 1 <= len(calls) <= 4
+
+
+def test_filtered_messages_do_not_use_rate_slots():
+    bus = Bus()
+    calls = []
+    sub = bus.subscribe("test_rate_filter", calls.append, max_rate=10, filter=lambda m: m == 2)
+    try:
+        publish_for(bus, "test_rate_filter", 0.05)
+        bus.publish("test_rate_filter", 2)
+    finally:
+        sub.unsubscribe()
+    assert calls == [2]
+
+
+def test_subscribe_and_unsubscribe_while_publishing():
+    bus = Bus()
+    steady = []
+    steady_sub = bus.subscribe("test_race", steady.append)
+    stop = threading.Event()
+    late = []
+    errors = []
+
+    def churn():
+        try:
+            while not stop.is_set():
+                received = []
+                sub = bus.subscribe("test_race", received.append)
+                time.sleep(0)
+                sub.unsubscribe()
+                seen = len(received)
+                time.sleep(0.001)
+                # At most the one message in flight during unsubscribe
+                if len(received) > seen + 1:
+                    late.append(len(received) - seen)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=churn) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    try:
+        for i in range(20000):
+            bus.publish("test_race", i)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+        steady_sub.unsubscribe()
+
+    assert not errors
+    assert not late
+    assert steady == list(range(20000))
+    assert bus.subscriber_count("test_race") == 0
+
+
+def test_collecting_a_weak_owner_under_the_bus_lock():
+    bus = Bus()
+
+    class Owner:
+        def __init__(self):
+            self.cycle = self
+
+        def on_message(self, msg):
+            pass
+
+    sub = bus.subscribe("test_collect", Owner().on_message)
+    gc.disable()
+    try:
+        # The owner is only reachable through its cycle; collect it while
+        # the lock is held, as a GC pass inside subscribe would
+        done = threading.Event()
+
+        def collect():
+            with bus._lock:
+                gc.collect()
+            done.set()
+
+        threading.Thread(target=collect, daemon=True).start()
+        assert done.wait(2.0)
+    finally:
+        gc.enable()
+    assert bus.subscriber_count("test_collect") == 0
+    assert not sub.active
+
+
+def test_async_callback_errors_are_reported(capsys):
+    bus = Bus()
+    received = []
+
+    def callback(msg):
+        if msg == 1:
+            raise RuntimeError("bad message")
+        received.append(msg)
+
+    sub = bus.subscribe("test_async_error", callback, queue_size=10)
+    try:
+        bus.publish("test_async_error", 1)
+        bus.publish("test_async_error", 2)
+        end = time.monotonic() + 2.0
+        while not received and time.monotonic() < end:
+            time.sleep(0.01)
+    finally:
+        sub.unsubscribe()
+    assert received == [2]
+    assert "RuntimeError: bad message" in capsys.readouterr().err
+
+
+def test_scaled_clock():
+    clock = ScaledClock(20.0, start=100.0)
+    assert 100.0 <= clock.now() < 100.5
+    wall = time.monotonic()
+    clock.sleep(2.0)
+    assert time.monotonic() - wall == pytest.approx(0.1, abs=0.05)
+    assert clock.now() == pytest.approx(102.0, abs=0.5)
@@ -0,0 +1,45 @@
+import pytest
+
+from src.bag import Recorder
+from src.core import bus, set_clock, VirtualClock
+from src.msgs import ImuSample, VehicleGlobalPosition
+from src.replay import Replay
+
+
+def record(path, output_period):
+    """Two seconds of 200 Hz IMU data with an output every output_period seconds."""
+    clock = VirtualClock()
+    previous = set_clock(clock)
+    try:
+        recorder = Recorder(path, ["imu_1", "imu_2", "vehicle_global_position"])
+        next_output = 100.0
+        for i in range(400):
+            t = 100.0 + i * 0.005
+            clock.set(t)
+            for topic in ("imu_1", "imu_2"):
+                bus.publish(topic, ImuSample(0.0, 0.0, 9.81, 0.0, 0.0, 0.0, t))
+            if t >= next_output - 1e-9:
+                bus.publish("vehicle_global_position",
+                            VehicleGlobalPosition(37.7, -122.4, 100.0, 0.0, 0.0, 0.0, False, t))
+                next_output += output_period
+        recorder.stop()
+    finally:
+        set_clock(previous)
+
+
+def test_steps_on_fixed_grid_by_default(tmp_path):
+    path = str(tmp_path / "decimated.bag")
+    record(path, 0.1)
+    replay = Replay(path, rate=50.0).run()
+    assert replay.steps == 99
+
+
+def test_recorded_steps_must_be_filter_ticks(tmp_path):
+    path = str(tmp_path / "ticks.bag")
+    record(path, 0.02)
+    assert Replay(path, rate=50.0, recorded_steps=True).run().steps == 100
+
+    path = str(tmp_path / "decimated.bag")
+    record(path, 0.1)
+    with pytest.raises(ValueError):
+        Replay(path, rate=50.0, recorded_steps=True).run()
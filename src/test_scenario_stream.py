@@ -0,0 +1,29 @@
+import pytest
+
+from src.scenario_stream import ScenarioStream, ScenarioError
+
+
+def write(tmp_path, text):
+    path = tmp_path / "scenario.txt"
+    path.write_text(text)
+    return str(path)
+
+
+def test_bad_line_is_reported_when_opened(tmp_path):
+    lines = [f"{t} dip 1 sats=8" for t in range(0, 3000, 10)] + ["3000 jam 5 colour=red"]
+    path = write(tmp_path, "\n".join(lines) + "\n")
+    with pytest.raises(ScenarioError, match=":301: jam does not take colour"):
+        ScenarioStream(path)
+
+
+def test_events_apply_as_time_passes(tmp_path):
+    path = write(tmp_path, "0 accel 1 0\n10 accel 0 0\n20 outage 5\n30 gps sats=3\n")
+    scenario = ScenarioStream(path, start=0.0)
+    assert scenario.accel(5.0) == (1.0, 0.0, 0.0)
+    assert scenario.accel(15.0) == (0.0, 0.0, 0.0)
+    assert scenario.sample(19.0)["satellites"] == 18
+    assert scenario.sample(22.0) is None
+    assert scenario.sample(30.0)["satellites"] == 3
+    assert scenario.sample(31.0)["satellites"] == 18
+    lat, lon, _ = scenario.truth(40.0)
+    assert lon > -122.4194 and lat == pytest.approx(37.7749)
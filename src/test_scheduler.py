@@ -0,0 +1,59 @@
+from src.core import set_clock, VirtualClock
+from src.scheduler import Scheduler
+
+
+def run_for(tasks, duration):
+    previous = set_clock(VirtualClock(100.0))
+    try:
+        scheduler = Scheduler()
+        for name, step, rate in tasks:
+            scheduler.add(name, step, rate)
+        scheduler.run(duration=duration)
+    finally:
+        set_clock(previous)
+    return scheduler
+
+
+def test_rate_zero_task_never_steps():
+    calls = []
+    run_for([("idle", lambda: calls.append(1), 0), ("none", lambda: calls.append(2), None)], 10.0)
+    assert calls == []
+
+
+def test_rate_follows_callable():
+    rate = [0]
+    calls = []
+    scheduler = Scheduler()
+    previous = set_clock(VirtualClock(0.0))
+    try:
+        scheduler.add("gps", lambda: calls.append(1), lambda: rate[0])
+        scheduler.run(duration=2.0)
+        assert calls == []
+        rate[0] = 5
+        scheduler.run(duration=2.0)
+    finally:
+        set_clock(previous)
+    assert 9 <= len(calls) <= 11
+
+
+def test_fixed_rate_runs_every_period():
+    calls = []
+    run_for([("imu", lambda: calls.append(1), 200)], 1.0)
+    assert 200 <= len(calls) <= 201
+
+
+def test_lateness_counts_only_real_misses():
+    clock = VirtualClock(0.0)
+    previous = set_clock(clock)
+    try:
+        scheduler = Scheduler()
+        # Oversleeping by 0.5 ms is jitter, a 10 ms step makes the next start late
+        scheduler.add("jitter", lambda: clock.set(clock.now() + 0.0005), 10)
+        scheduler.run(duration=1.0)
+        assert sum(scheduler.lateness.counts) == 0
+        slow = scheduler.add("slow", lambda: clock.set(clock.now() + 0.110), 10)
+        scheduler.run(duration=1.0)
+    finally:
+        set_clock(previous)
+    assert slow.runs > 0
+    assert sum(scheduler.lateness.counts) > 0